@@ -0,0 +1,133 @@
+# runs the scraping processes and the writer of main.py against the local replay server and
+# reports their throughput
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from imdb_scrapper.lib import async_scrapper, retry_store, work_queue
+from imdb_scrapper.lib.orchestrator import orchestrate
+from imdb_scrapper.lib.replay import (
+    REPLAY_PORT,
+    get_replay_base_path,
+    get_replay_ids,
+    start_replay_server,
+)
+from imdb_scrapper.lib.selector_registry import get_selector_report
+
+logging.basicConfig(
+    format="%(levelname)s:%(message)s", encoding="utf-8", level=logging.WARNING
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(
+        description="measure the scraper against recorded pages, without network"
+    )
+    parser.add_argument("--pages", type=int, default=1000, help="pages to scrape")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="number of scraping processes, as --workers of main.py (default: 1)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of parse processes of each scraping process (default: cpu count)",
+    )
+    parser.add_argument(
+        "--corpus",
+        default=None,
+        help="directory of .html pages or a page cache (default: the page cache)",
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per page")
+    parser.add_argument("--jitter", type=float, default=0.02, help="+- seconds")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of 503 answers"
+    )
+    parser.add_argument("--port", type=int, default=REPLAY_PORT)
+    return parser.parse_args()
+
+
+def get_percentile(_values, _percentile):
+    if len(_values) < 2:
+        return _values[0] if _values else 0
+    return statistics.quantiles(_values, n=100)[_percentile - 1]
+
+
+def print_report(_stats, _latencies, _seconds):
+    _pages = _stats["pages"] or 1
+    print(f"pages parsed:      {_stats['pages']} in {_seconds:.2f} s")
+    print(f"pages/sec:         {_stats['pages'] / _seconds:.1f}")
+    print(f"fetch latency p50: {get_percentile(_latencies, 50) * 1000:.1f} ms")
+    print(f"fetch latency p99: {get_percentile(_latencies, 99) * 1000:.1f} ms")
+    print(f"parse time/page:   {_stats['parse_seconds'] / _pages * 1000:.2f} ms")
+    print(f"db rows/sec:       {_stats['rows'] / _seconds:.1f}")
+    print(f"parse failures:    {_stats['parse_failures']}")
+    print(f"write failures:    {_stats['write_failures']}")
+    _writer = _stats.get("writer") or {}
+    if _writer:
+        print(
+            f"writer:            {_writer['rows']} rows of {_writer['records']} records, "
+            f"{_writer['failed']} failed"
+        )
+        print(
+            f"  {_writer['groups']} groups of {_writer['records_per_group']:.1f} records, "
+            f"queue depth up to {_writer['max_queue_depth']}"
+        )
+        print(
+            f"  commit latency p50 {_writer['latency_p50'] * 1000:.1f} ms, "
+            f"p99 {_writer['latency_p99'] * 1000:.1f} ms"
+        )
+    for _field, (_calls, _seconds) in sorted(
+        _stats["fields"].items(), key=lambda item: -item[1][1]
+    ):
+        print(f"  {_field:<14} {_seconds / _pages * 1000:.3f} ms/page over {_calls} calls")
+    print("selector hits (selectors that never match can be removed):")
+    for _name, _selector, _hits in get_selector_report(_stats["selectors"]):
+        print(f"  {_name:<16} {_hits:>7}  {_selector or '(no match)'}")
+
+
+def bench(arguments):
+    # the per page logs of the pipeline would drown the report
+    logging.getLogger().setLevel(logging.WARNING)
+    # the benchmark writes to throw away databases, never to the real ones, the
+    # scraping processes and the writer forked by orchestrate inherit the locations
+    _directory = tempfile.mkdtemp(prefix="imdb_bench_")
+    async_scrapper.DATABASE_LOCATION = os.path.join(_directory, "imdb.db")
+    retry_store.RETRY_DATABASE_LOCATION = os.path.join(_directory, "retry_queue.db")
+    work_queue.WORK_QUEUE_LOCATION = os.path.join(_directory, "work_queue.db")
+    async_scrapper.set_up_database()
+    _work_queue = work_queue.WorkQueue("add")
+    _work_queue.add(get_replay_ids(arguments.pages))
+    _work_queue.close()
+
+    server = start_replay_server(
+        arguments.corpus,
+        arguments.port,
+        arguments.latency,
+        arguments.jitter,
+        arguments.error_rate,
+    )
+    try:
+        _start_time = time.time()
+        _stats = orchestrate(
+            "add",
+            arguments.processes,
+            arguments.workers,
+            base_path=get_replay_base_path(arguments.port),
+        )
+        _seconds = time.time() - _start_time
+    finally:
+        server.terminate()
+    print_report(_stats, _stats["latencies"], _seconds)
+
+
+if __name__ == "__main__":
+    bench(get_arguments())
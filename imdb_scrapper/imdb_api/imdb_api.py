@@ -1,10 +1,12 @@
 import os
-from typing import Optional
+from typing import List, Optional
 
 import uvicorn
 from databases import Database
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from lib.async_scrapper import single_scrape
+from lib.search import SEARCH_TABLE, get_match_query
+from lib.session import get_session_manager
 
 app = FastAPI()
 CURRENT_DIR_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -13,6 +15,45 @@ MOVIES_TABLE = "movie_details"
 SERIES_TABLE = "serie_details"
 DATABASE_LOCATION = os.path.join(CURRENT_DIR_PATH, "database", DATABASE_NAME)
 IMDB_DB = Database(f"sqlite:///{DATABASE_LOCATION}")
+# countries left out of the movies and series leaderboards unless others are given
+EXCLUDED_COUNTRIES = ["India", "Turkey", "Bangladesh"]
+# best bm25 matches of a search re-ranked with their voters, fts5 reads them in rank
+# order from the index instead of sorting every match
+SEARCH_CANDIDATES = 1000
+
+
+def get_dimension_filters(**filters):
+    """conditions keeping the titles having one of the names of a dimension, or none of
+    them for the exclude_ ones, each read from the index of its title_ table
+
+    Args:
+        filters (list): names of genre, country, exclude_genre or exclude_country
+
+    Returns:
+        tuple: (conditions, values) to add to a WHERE clause
+    """
+    conditions = ""
+    values = {}
+    for name, names in filters.items():
+        if not names:
+            continue
+        dimension = name.removeprefix("exclude_")
+        placeholders = []
+        for index, value in enumerate(names):
+            values[f"{name}_{index}"] = value
+            placeholders.append(f":{name}_{index}")
+        conditions += f""" and imdb_id {"NOT IN" if name.startswith("exclude_") else "IN"}
+            (SELECT imdb_id FROM title_{dimension} JOIN {dimension} USING ({dimension}_id)
+            WHERE {dimension}.name IN ({", ".join(placeholders)}))"""
+    return conditions, values
+
+
+async def fetch_leaderboard(table, genre, exclude_genre, country, exclude_country):
+    conditions, values = get_dimension_filters(
+        genre=genre, exclude_genre=exclude_genre, country=country, exclude_country=exclude_country
+    )
+    query = f"SELECT * FROM {table} WHERE voters > 10000{conditions} ORDER BY score DESC, voters DESC LIMIT 200"
+    return await IMDB_DB.fetch_all(query=query, values=values)
 
 
 @app.on_event("startup")
@@ -23,6 +64,7 @@ async def database_connect():
 @app.on_event("shutdown")
 async def database_disconnect():
     await IMDB_DB.disconnect()
+    await get_session_manager().close()
 
 
 @app.get("/")
@@ -34,53 +76,74 @@ async def fetch_data():
 
 
 @app.get("/movies")
-async def fetch_movies():
-    query = f"SELECT * FROM {MOVIES_TABLE} WHERE voters > 10000 and countries NOT IN ('IN%','TURK%','BANGL%') ORDER BY score DESC, voters DESC LIMIT 200"
-    movies = await IMDB_DB.fetch_all(query=query)
+async def fetch_movies(
+    genre: List[str] = Query([]),
+    exclude_genre: List[str] = Query([]),
+    country: List[str] = Query([]),
+    exclude_country: List[str] = Query(EXCLUDED_COUNTRIES),
+):
+    movies = await fetch_leaderboard(MOVIES_TABLE, genre, exclude_genre, country, exclude_country)
 
     return movies
 
 
 @app.get("/series")
-async def fetch_movies():
-    query = f"SELECT * FROM {SERIES_TABLE} WHERE voters > 10000 and countries NOT IN ('IN%','TURK%','BANGL%') ORDER BY score DESC, voters DESC LIMIT 200"
-    series = await IMDB_DB.fetch_all(query=query)
+async def fetch_movies(
+    genre: List[str] = Query([]),
+    exclude_genre: List[str] = Query([]),
+    country: List[str] = Query([]),
+    exclude_country: List[str] = Query(EXCLUDED_COUNTRIES),
+):
+    series = await fetch_leaderboard(SERIES_TABLE, genre, exclude_genre, country, exclude_country)
 
     return series
 
 
 @app.get("/api/{imdb_id}")
 async def fetch_movies(imdb_id: str):
-    query = f'SELECT * FROM {MOVIES_TABLE} WHERE imdb_id like "{imdb_id}"'
-    search_result = await IMDB_DB.fetch_all(query=query)
+    query = f"SELECT * FROM {MOVIES_TABLE} WHERE imdb_id = :imdb_id"
+    search_result = await IMDB_DB.fetch_all(query=query, values={"imdb_id": imdb_id})
     if not search_result:
-        query = f'SELECT * FROM {SERIES_TABLE} WHERE imdb_id like "{imdb_id}"'
-        search_result = await IMDB_DB.fetch_all(query=query)
+        query = f"SELECT * FROM {SERIES_TABLE} WHERE imdb_id = :imdb_id"
+        search_result = await IMDB_DB.fetch_all(query=query, values={"imdb_id": imdb_id})
     if not search_result:
-        single_scrape(imdb_id)
-        query = f'SELECT * FROM {MOVIES_TABLE} WHERE imdb_id like "{imdb_id}"'
-        search_result = await IMDB_DB.fetch_all(query=query)
+        await single_scrape(imdb_id)
+        query = f"SELECT * FROM {MOVIES_TABLE} WHERE imdb_id = :imdb_id"
+        search_result = await IMDB_DB.fetch_all(query=query, values={"imdb_id": imdb_id})
         if not search_result:
-            query = f'SELECT * FROM {SERIES_TABLE} WHERE imdb_id like "{imdb_id}"'
-            search_result = await IMDB_DB.fetch_all(query=query)
+            query = f"SELECT * FROM {SERIES_TABLE} WHERE imdb_id = :imdb_id"
+            search_result = await IMDB_DB.fetch_all(query=query, values={"imdb_id": imdb_id})
     return search_result
 
 
+async def search_titles(table, title, year, fold_accents):
+    """the titles of table matching title, the best bm25 matches first, weighted by the
+    log of their voters so well known titles come before obscure ones. only the
+    SEARCH_CANDIDATES best matches of both tables are re-ranked"""
+    values = {}
+    year_condition = ""
+    if year:
+        values["year"] = year
+        year_condition = " and details.release_year = :year"
+    match_query = get_match_query(title, fold_accents)
+    if not match_query:
+        # too short for the trigram index
+        values["title"] = f"%{title}%"
+        query = f"SELECT * FROM {table} AS details WHERE title like :title{year_condition} ORDER BY voters DESC, score DESC LIMIT 200"
+        return await IMDB_DB.fetch_all(query=query, values=values)
+    values["match"] = match_query
+    values["candidates"] = SEARCH_CANDIDATES
+    query = f"""SELECT details.* FROM (SELECT imdb_id, rank FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH :match ORDER BY rank LIMIT :candidates) AS candidates
+        CROSS JOIN {table} AS details USING (imdb_id) WHERE true{year_condition}
+        ORDER BY candidates.rank * ln(2 + coalesce(details.voters, 0)) LIMIT 200"""
+    return await IMDB_DB.fetch_all(query=query, values=values)
+
+
 @app.get("/api/search/{title}")
-async def fetch_movies(title: str, year: Optional[str] = None):
-    if not year:
-        query = f'SELECT * FROM {MOVIES_TABLE} WHERE title like "%{title}%" ORDER BY voters DESC, score DESC LIMIT 200'
-        search_movies = await IMDB_DB.fetch_all(query=query)
-        query = f'SELECT * FROM {SERIES_TABLE} WHERE title like "%{title}%" ORDER BY voters DESC, score DESC LIMIT 200'
-        search_series = await IMDB_DB.fetch_all(query=query)
-        return search_movies + search_series
-
-    query = f'SELECT * FROM {MOVIES_TABLE} WHERE title like "%{title}%" and strftime("%Y", release_date) like "{year}" ORDER BY voters DESC, score DESC LIMIT 200'
-    print(query)
-    search_movies = await IMDB_DB.fetch_all(query=query)
-
-    query = f'SELECT * FROM {SERIES_TABLE} WHERE title like "%{title}%" and strftime("%Y", release_date) like "{year}" ORDER BY voters DESC, score DESC LIMIT 200'
-    search_series = await IMDB_DB.fetch_all(query=query)
+async def fetch_movies(title: str, year: Optional[int] = None, fold_accents: bool = False):
+    search_movies = await search_titles(MOVIES_TABLE, title, year, fold_accents)
+    search_series = await search_titles(SERIES_TABLE, title, year, fold_accents)
     return search_movies + search_series
 
 
@@ -2,3 +2,22 @@ from . import async_scrapper
 from . import imdb_id
 from . import imdb
 from . import updater
+from . import page_data
+from . import session
+from . import limiter
+from . import retry_store
+from . import page_cache
+from . import replay
+from . import selector_registry
+from . import work_queue
+from . import ratings
+from . import tconst
+from . import snapshot
+from . import scheduler
+from . import orchestrator
+from . import shards
+from . import database
+from . import writer
+from . import migrations
+from . import dimensions
+from . import search
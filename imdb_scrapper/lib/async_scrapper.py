@@ -1,9 +1,11 @@
 # https://blog.jonlu.ca/posts/async-python-http
 
 # Importing the required modules
-import ast
 import asyncio
+import functools
 import gc
+import html
+import itertools
 import json
 import logging
 import math
@@ -11,12 +13,36 @@ import os
 import re
 import sqlite3
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import aiohttp
 import async_timeout
 from bs4 import BeautifulSoup
 
+from imdb_scrapper.lib import dimensions, page_data, search
 from imdb_scrapper.lib.imdb import Imdb, ImdbMovie, ImdbSerie, ImdbEpisode
+from imdb_scrapper.lib.imdb_id import MAX_CHUNK_LENGHT
+from imdb_scrapper.lib.limiter import OVERLOAD_STATUS, AimdLimiter
+from imdb_scrapper.lib.migrations import migrate
+from imdb_scrapper.lib.page_cache import CACHE_ERRORS, PageCache
+from imdb_scrapper.lib.retry_store import RetryStore, get_backoff
+from imdb_scrapper.lib.database import get_database
+from imdb_scrapper.lib.selector_registry import (
+    add_selector_hits,
+    pop_selector_hits,
+    select,
+    select_first,
+    select_one,
+)
+from imdb_scrapper.lib.session import get_session_manager
+from imdb_scrapper.lib.tconst import (
+    IMDB_BASE_PATH,
+    IdBitmap,
+    decode,
+    encode,
+    from_url,
+    to_url,
+)
 
 ################################################################################
 
@@ -39,35 +65,85 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# number of requests in flight at the start, adapted while the pages come in
+PARALLEL_REQUESTS = 10
+# highest number of requests the concurrency limiter may allow in flight
+MAX_PARALLEL_REQUESTS = 200
+# attempts made at a url before it is left to the retry store
+FETCH_RETRIES = 3
+# seconds waited before retrying a url, doubled with every attempt
+FETCH_BACKOFF_BASE = 1
+FETCH_BACKOFF_CAP = 30
+# number of pages parsed at the same time when no parse executor is given
+PARSE_WORKERS = 2
+# raw pages waiting to be parsed, bounds the memory used by the pipeline
+PAGE_QUEUE_SIZE = 20
+# parsed records waiting to be written to the database
+RECORD_QUEUE_SIZE = 50
+# read fields from the json embedded in the page and only build a
+# BeautifulSoup tree for the ones it does not have
+FAST_EXTRACTION = True
+# tables holding a scraped title, an id found in any of them is not scraped again
+SCRAPED_TABLES = ("movie_details", "serie_details", "episode_details")
+# rows fetched at a time when reading every scraped id
+SCAN_BATCH = 10000
+# put on a stage queue to tell its consumer there is nothing left
+STAGE_DONE = None
+
+# label of the section holding the countries of a title
+COUNTRIES_LABEL = re.compile(r"^\s*Countr(y|ies) of origin\s*$")
+# line breaks and non breaking spaces of a text read on a page, collapsed to a space
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# per field [calls, seconds] spent in the extractors of this process
+FIELD_TIMINGS = {}
+
 ################################################################################
 
 
-def database_excute_command(_command, _fetch_type="none"):
+def timed_field(_field):
+    """count the calls and the time spent in an extractor under FIELD_TIMINGS[_field]"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            _start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _timing = FIELD_TIMINGS.setdefault(_field, [0, 0.0])
+                _timing[0] += 1
+                _timing[1] += time.perf_counter() - _start_time
+
+        return wrapper
+
+    return decorator
+
+
+def pop_field_timings():
+    _field_timings = dict(FIELD_TIMINGS)
+    FIELD_TIMINGS.clear()
+    return _field_timings
+
+
+def database_excute_command(_command, _fetch_type="none", _params=()):
     """use this function to interact with the database
 
     Args:
         _command (str): the sql command to be excuted
         _fetch_type (str, optional): [either none, fetch_one or fetch_all]. Defaults to 'none'.
+        _params (tuple, optional): values bound to the ? of _command. Defaults to ().
     """
 
-    with sqlite3.connect(DATABASE_LOCATION) as _connection:
-        try:
-            _cursor = _connection.cursor()
-            match _fetch_type.lower():
-                case "none":
-                    result = _cursor.execute(_command)
-                case "fetch_one":
-                    result = _cursor.execute(_command).fetchone()
-                case "fetch_all":
-                    result = _cursor.execute(_command).fetchall()
-            return result
-        except sqlite3.Error as e:
-            logger.warning(_command)
-            logger.warning(e)
-            return False
-        finally:
-            _connection.commit()
-            _cursor.close()
+    # the connection of the process is kept open, see database.get_database
+    try:
+        return get_database(DATABASE_LOCATION).execute(
+            _command, _params, fetch_type=_fetch_type
+        )
+    except sqlite3.Error as e:
+        logger.warning(_command)
+        logger.warning(e)
+        return False
 
 
 def check_table_exists(_table_name):
@@ -103,6 +179,9 @@ def set_up_database():
         )
         episode_details = database_excute_command(_sql_command)
 
+    # the tables are created as they first were, migrate brings them to the current schema
+    migrate(get_database(DATABASE_LOCATION))
+
 
 def check_item_exists(_imdb_id):
     sql_command = f"""SELECT count(*)
@@ -130,106 +209,81 @@ def check_item_exists(_imdb_id):
                 return False
 
 
+def get_scraped_ids():
+    """every imdb id of the scraped tables, read in one scan
+
+    Returns:
+        IdBitmap: the imdb ids already in the database
+    """
+    _command = " UNION ALL ".join(
+        f"SELECT imdb_id FROM {_table_name}" for _table_name in SCRAPED_TABLES
+    )
+    _cursor = get_database(DATABASE_LOCATION).cursor(_command)
+    _scraped_ids = IdBitmap()
+    while _rows := _cursor.fetchmany(SCAN_BATCH):
+        _scraped_ids.update(_row[0] for _row in _rows)
+    return _scraped_ids
+
+
+def filter_unseen_ids(_imdb_ids, _scraped_ids=None):
+    """yield the ids of _imdb_ids not scraped yet, for a whole dump at once
+
+    Args:
+        _imdb_ids (iterable): candidate imdb ids, ints or tconsts, consumed lazily
+        _scraped_ids (IdBitmap, optional): ids to leave out. Defaults to get_scraped_ids().
+    """
+    _scraped_ids = get_scraped_ids() if _scraped_ids is None else _scraped_ids
+    logger.info(f"{len(_scraped_ids)} ids already scraped are filtered out")
+    for imdb_id in _imdb_ids:
+        if imdb_id not in _scraped_ids:
+            yield imdb_id
+
+
 def list_to_string(_list):
-    formatted_string = _list[0]
-    formatted_string = [formatted_string.join(f", {item}") for item in _list[1:]]
-    return formatted_string
+    return ", ".join(_list)
 
 
 def clean_text(_text):
-    cleaned_text = _text.strip().replace("\n", "")
-    cleaned_text = cleaned_text.replace('"', "")
-    cleaned_text = cleaned_text.replace(";", "")
-    cleaned_text = cleaned_text.replace(":", "")
-    cleaned_text = cleaned_text.replace("\xa0", "")
-    cleaned_text = cleaned_text.replace("&amp;", "&")
-    cleaned_text = cleaned_text.replace("&amp", "&")
-    cleaned_text = cleaned_text.replace("""&quot""", "")
-    cleaned_text = cleaned_text.replace("&apos;", "'")
-    cleaned_text = cleaned_text.replace("&apos", "'")
+    """the text as it is read on the page, quotes and punctuation are kept since the
+    values are bound to the statements and never written into the sql"""
+    cleaned_text = html.unescape(_text).replace("See full summary»", "")
     cleaned_text = cleaned_text.replace("             EN", "")
-    cleaned_text = (
-        cleaned_text.replace("See full summary»", "").replace("'", "").strip()
-    )
-    return cleaned_text
+    return WHITESPACE_PATTERN.sub(" ", cleaned_text).strip()
 
 
 def get_imdb_id(_link):
-    return re.search("https://www.imdb.com/title/(.{10}?|.{9})", _link).group(1)
-
-
-def get_countries(_soup):
-    clean_countries = []
-    _css_selectors = [
-        "section.ipc-page-section:nth-child(28) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(32) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(33) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(34) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(35) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(36) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(37) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(40) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(41) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(44) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(45) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-        "section.ipc-page-section:nth-child(46) > div:nth-child(2) > ul:nth-child(1) > li:nth-child(2) > div:nth-child(2) > ul:nth-child(1)",
-    ]
-    for _css_selector in iter(_css_selectors):
-        try:
-            ul = _soup.select_one(_css_selector)
-            items = ul.find_all("li")
-            clean_countries = [item.text for item in items]
-            if (
-                "Color" in clean_countries
-                or "Black and White" in clean_countries
-                or "$" in clean_countries[0]
-            ):
-                clean_countries = ["NA"]
-                continue
-        except AttributeError:
-            clean_countries = []
+    return from_url(_link)
+
+
+@timed_field("countries")
+def get_countries(_soup, _next_data=None):
+    """countries of origin, read once from the json embedded in the page and only looked
+    up in the html, by the label of their section, when the json does not have them"""
+    if _next_data is None:
+        _next_data = get_next_data(_soup)
+    _countries = page_data.get_countries(_next_data)
+    if _countries:
+        return _countries
+
+    for _label in _soup.find_all(string=COUNTRIES_LABEL):
+        _section = _label.find_parent("li")
+        if not _section:
             continue
-    if "NA" in clean_countries or not clean_countries:
-        try:
-            countries = re.search(
-                '(?<="countriesOfOrigin":{"countries":)(.*)(?=,"__typename":"CountriesOfOrigin"},"detailsExternalLinks")',
-                str(_soup),
-            ).group(1)
-            countries = ast.literal_eval(countries)
-            clean_countries = [country["text"] for country in countries]
-        except AttributeError:
-            clean_countries = ["NA"]
-        except SyntaxError:
-            countries = re.search(
-                '(?<="countriesOfOrigin":{"countries":)(.*)(?=,"__typename":"CountryOfOrigin")',
-                str(countries),
-            ).group(1)
-
-            countries = str(f"{countries}" + "}]")
-            """logger.info('#######################################################################')
-            logger.info('countries', countries)
-            logger.info('#######################################################################')"""
-            try:
-                countries = ast.literal_eval(countries)
-            except SyntaxError:
-                countries = re.search(
-                    '(?<="countriesOfOrigin":{"countries":)(.*)(?=\])', str(countries)
-                ).group(1)
-                countries = str(f"{countries}" + "]")
-            try:
-                countries = ast.literal_eval(str(countries))
-                clean_countries = [country["text"] for country in countries]
-            except KeyError:
-                clean_countries = ["NA"]
-            except TypeError:
-                logger.warning("TypeError countries", countries)
-                raise Exception("TypeError")
-            except SyntaxError:
-                logger.warning("SyntaxError countries", countries)
-                raise Exception("SyntaxError")
-    if not clean_countries:
-        clean_countries = ["NA"]
-    return ", ".join(clean_countries)
+        _items = _section.find_all("li")
+        _countries = [item.get_text(strip=True) for item in _items]
+        _countries = [country for country in _countries if country]
+        if _countries:
+            return _countries
+    return ["NA"]
+
+
+def get_next_data(_soup):
+    """the page props of the __NEXT_DATA__ script of a parsed page"""
+    _script = _soup.find("script", id="__NEXT_DATA__")
+    try:
+        return json.loads(_script.string)["props"]["pageProps"]
+    except (AttributeError, TypeError, KeyError, json.decoder.JSONDecodeError):
+        return None
 
 
 def get_image_full_size(_image):
@@ -237,11 +291,11 @@ def get_image_full_size(_image):
     return f"{_image}jpg"
 
 
+@timed_field("title")
 def get_title(_soup):
     _title = "NA"
-    _css_selector = ".TitleHeader__TitleText-sc-1wu6n3d-0"
     try:
-        _title = _soup.select_one(_css_selector).text
+        _title = select_one(_soup, "title").text
     except AttributeError:
         logger.warning(f"get_title AttributeError")
     return clean_text(_title)
@@ -251,7 +305,8 @@ def get_score(_media_info):
     try:
         _score = float(_media_info["aggregateRating"]["ratingValue"])
     except KeyError:
-        _score = -1
+        # not rated yet
+        _score = None
     return _score
 
 
@@ -274,22 +329,15 @@ def get_plot(_media_info):
     return _plot
 
 
+@timed_field("director")
 def get_director(_soup):
-
-    _css_selectors = [
-        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0 > ul:nth-child(1) > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
-        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-hdn81t-0 > ul:nth-child(1) > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
-    ]
-    for _css_selector in _css_selectors:
-        try:
-            ul = _soup.select_one(_css_selector)
-            li = ul.find_all("li")
-            _creators = [item.find("a").text for item in li]
-            return ", ".join(_creators)
-        except AttributeError:
-            _creators = ["NA"]
-            continue
-    return ", ".join(_creators)
+    try:
+        ul = select_one(_soup, "director")
+        li = ul.find_all("li")
+        _creators = [item.find("a").text for item in li]
+    except AttributeError:
+        _creators = ["NA"]
+    return _creators
 
 
 def clean_creator(_creator):
@@ -301,20 +349,19 @@ def clean_creator(_creator):
         except KeyError:
             logger.warning("This is an Organization")
     if person_creator:
-        return list_to_string(person_creator)
+        return person_creator
     else:
-        return "This was created by an Organization"
+        return ["This was created by an Organization"]
 
 
+@timed_field("seasons")
 def get_seasons(_soup):
     try:
-        _seasons = _soup.select("#browse-episodes-season")
+        _seasons = select(_soup, "seasons_label")
         return int(_seasons[0]["aria-label"].replace(" seasons", ""))
     except IndexError:
         try:
-            _seasons = _soup.select_one(
-                ".BrowseEpisodes__BrowseLinksContainer-sc-1a626ql-4 > a:nth-child(2) > div:nth-child(1)"
-            ).text
+            _seasons = select_one(_soup, "seasons_link").text
             _cleaned_season = (
                 _seasons.replace(" seasons", "")
                 .replace(" season", "")
@@ -327,42 +374,26 @@ def get_seasons(_soup):
             return "NA"
 
 
+@timed_field("runtime")
 def get_series_runtime(_soup):
     _runtime = "NA"
-    _css_selectors = [
-        ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(4)",
-        ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(3)",
-    ]
-    for _css_selector in _css_selectors:
-        try:
-            _runtime = _soup.select_one(_css_selector).text
-            return _runtime.strip()
-        except AttributeError:
-            logger.warning("get_series_runtime AttributeError")
-            continue
+    try:
+        _runtime = select_one(_soup, "series_runtime").text
+    except AttributeError:
+        logger.warning("get_series_runtime AttributeError")
     return _runtime.strip()
 
 
-def _get_actors_helper(_soup, _css_selector):
-    ul = _soup.select_one(_css_selector)
-    li = ul.find_all("li")
-    _actors = [item.find("a").text for item in li]
-    return _actors
-
-
+@timed_field("credits")
 def get_creator_actor(_soup, is_series=False):
     _creator = []
     _actor = []
-    _result = []
-    _css_selectors = [
-        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0 > ul:nth-child(1)",
-        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0",
-    ]
+    _selector_names = ["credits_creator", "credits_star"]
     _current_itteration = {"0": "Creator", "1": "Star"}
     _loop_counter = 0
-    for _css_selector in _css_selectors:
+    for _selector_name in _selector_names:
         try:
-            div = _soup.select_one(_css_selector)
+            div = select_one(_soup, _selector_name)
             li_div = div.find_all("li")
             for li in li_div:
                 if _current_itteration[f"{_loop_counter}"] in li.text:
@@ -383,69 +414,51 @@ def get_creator_actor(_soup, is_series=False):
         _actor = ["NA"]
 
     if is_series:
-        return ", ".join(_creator), ", ".join(_actor)
+        return _creator, _actor
     else:
-        return ", ".join(_actor)
+        return _actor
 
 
+@timed_field("years")
 def get_series_years(_soup):
     try:
-        _year = (
-            _soup.select_one(
-                ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(2)"
-            ).text
-        ).strip()
+        _year = (select_one(_soup, "series_years").text).strip()
         return _year[: len(_year) // 2]
     except AttributeError:
         return "NA"
 
 
-def get_genres(_media_info, _soup):
-    _css_selectors = [
-        "ul.ipc-metadata-list:nth-child(4) > li:nth-child(1) > div:nth-child(2)",
-        "ul.ipc-metadata-list:nth-child(4) > li:nth-child(2) > div:nth-child(2)",
-        ".Storyline__StorylineMetaDataList-sc-1b58ttw-1 > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
-    ]
-    _genres = []
-    _flag = False
-    try:
-        return ", ".join(_media_info["genres"])
-    except KeyError:
-        try:
-            for _css_selector in _css_selectors:
-                ul = _soup.select_one(_css_selector)
-                items = ul.find_all("li")
-                for item in items:
-                    if len(item.text) < 12:
-                        _genres.append(item.text)
-                if _genres:
-                    return ", ".join(_genres)
-        except AttributeError:
-            _genres = ["NA"]
-    if not _genres or "NA" in _genres:
-        try:
-            _genres = []
-            _div_selector = "div.ipc-chip-list:nth-child(1)"
-            div = _soup.select_one(_div_selector)
-            items = div.find_all("a")
-            for item in items:
-                if len(item.text) < 12:
-                    _genres.append(item.text)
-            if _genres:
-                return ", ".join(_genres)
-        except AttributeError:
-            _genres = ["NA"]
-    return ", ".join(_genres)
+def get_short_genres(_element, _tag):
+    """the texts of the _tag items of _element short enough to be a genre"""
+    return [item.text for item in _element.find_all(_tag) if len(item.text) < 12]
 
 
-def get_voters(_media_info, _soup):
+@timed_field("genres")
+def get_genres(_media_info, _soup, _next_data=None):
+    try:
+        _genres = _media_info["genres"]
+        # a single genre is given as a string
+        return [_genres] if isinstance(_genres, str) else list(_genres)
+    except KeyError:
+        pass
+    if _next_data_genres := page_data.get_genres(_next_data):
+        return _next_data_genres
+    # a list matched without any genre in it falls through to the next selector
+    _genres = select_first(_soup, "genres", lambda ul: get_short_genres(ul, "li"))
+    if _genres:
+        return _genres
+    return select_first(_soup, "genres_chips", lambda div: get_short_genres(div, "a")) or ["NA"]
+
+
+@timed_field("voters")
+def get_voters(_media_info, _soup, _next_data=None):
     try:
         return int(_media_info["aggregateRating"]["ratingCount"])
     except KeyError:
+        if _voters := page_data.get_voters(_next_data):
+            return int(_voters)
         try:
-            _div = _soup.select_one(
-                "ul.ipc-metadata-list:nth-child(4) > li:nth-child(2) > div:nth-child(2)"
-            )
+            _div = select_one(_soup, "voters")
             return int(_div.text)
         except AttributeError:
             return "NA"
@@ -453,30 +466,32 @@ def get_voters(_media_info, _soup):
             return "NA"
 
 
-def get_release_date(_media_info, _soup):
+@timed_field("release_date")
+def get_release_date(_media_info, _soup, _next_data=None):
     _release_date = "NA"
     try:
         _release_date = _media_info["datePublished"]
     except KeyError:
+        if _next_data_release_date := page_data.get_release_date(_next_data):
+            return _next_data_release_date
         try:
-            _div = _soup.select_one(
-                ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(1) > a:nth-child(1)"
-            )
+            _div = select_one(_soup, "release_date")
             _release_date = _div.text
         except AttributeError:
             return _release_date
     return _release_date
 
 
-def get_rated(_media_info, _soup):
+@timed_field("rated")
+def get_rated(_media_info, _soup, _next_data=None):
     _rated = "NA"
     try:
         _rated = _media_info["contentRating"]
     except KeyError:
+        if _next_data_rated := page_data.get_rated(_next_data):
+            return _next_data_rated
         try:
-            _div = _soup.select_one(
-                "ul.ipc-inline-list--show-dividers:nth-child(2) > li:nth-child(3) > a:nth-child(1)"
-            )
+            _div = select_one(_soup, "rated")
             _rated = _div.text
         except AttributeError:
             return _rated
@@ -484,10 +499,17 @@ def get_rated(_media_info, _soup):
 
 
 def get_details(_media_data):
+    """build the Imdb record of a page
+
+    Args:
+        _media_data (tuple): (imdb_id, soup, media_info) with an optional fourth item, the
+            __NEXT_DATA__ page props, whose fields are used before falling back to the soup.
+    """
     try:
         imdb_id, soup, media_info = _media_data[0], _media_data[1], _media_data[2]
     except TypeError:
         return False
+    next_data = _media_data[3] if len(_media_data) > 3 else None
     if not media_info:
         return False
     media_type = media_info["@type"]
@@ -509,23 +531,29 @@ def get_details(_media_data):
             "NA",
         )
 
-    title = get_title(soup)
+    title = clean_text(page_data.get_title(next_data) or "") or get_title(soup)
     original_title = clean_text(media_info["name"])
-    voters = get_voters(media_info, soup)
-    rated = get_rated(media_info, soup)
-    release_date = get_release_date(media_info, soup)
+    voters = get_voters(media_info, soup, next_data)
+    rated = get_rated(media_info, soup, next_data)
+    release_date = get_release_date(media_info, soup, next_data)
     poster = get_poster(media_info)
-    countries = get_countries(soup)
+    countries = get_countries(soup, next_data)
     score = get_score(media_info)
     plot = get_plot(media_info)
-    genre = get_genres(media_info, soup)
+    genre = get_genres(media_info, soup, next_data)
+    # column -> names as the extractors listed them, the columns hold them joined
+    names = {"genre": genre, "countries": countries}
     match media_type:
         case "TVSeries":
             media_type = "TV Series"
-            creator, actors = get_creator_actor(soup, True)
-            seasons = get_seasons(soup)
-            runtime = get_series_runtime(soup)
-            years = get_series_years(soup)
+            creator = page_data.get_credits(next_data, "creator")
+            actors = page_data.get_credits(next_data, "cast")
+            if not creator or not actors:
+                _creator, _actors = get_creator_actor(soup, True)
+                creator, actors = creator or _creator, actors or _actors
+            seasons = page_data.get_seasons(next_data) or get_seasons(soup)
+            runtime = page_data.get_runtime(next_data) or get_series_runtime(soup)
+            years = page_data.get_series_years(next_data) or get_series_years(soup)
             """try:
                 creator = clean_creator(media_info['creators'])
             except KeyError:
@@ -534,7 +562,7 @@ def get_details(_media_data):
                 if years != "NA":
                     release_date = years.split("-")[0]
 
-            return ImdbSerie(
+            serie = ImdbSerie(
                 imdb_id,
                 title,
                 original_title,
@@ -543,23 +571,27 @@ def get_details(_media_data):
                 plot,
                 poster,
                 rated,
-                genre,
+                list_to_string(genre),
                 media_type,
                 release_date,
-                countries,
-                actors,
-                creator,
+                list_to_string(countries),
+                list_to_string(actors),
+                list_to_string(creator),
                 runtime,
                 years,
                 seasons,
             )
+            serie.names = {**names, "actors": actors, "creator": creator}
+            return serie
 
         case "Movie":
-            actors = get_creator_actor(soup)
+            actors = page_data.get_credits(next_data, "cast") or get_creator_actor(soup)
             try:
                 director = clean_creator(media_info["directors"])
             except KeyError:
-                director = get_director(soup)
+                director = page_data.get_credits(next_data, "director") or get_director(
+                    soup
+                )
             try:
                 runtime = (
                     media_info["duration"]
@@ -570,7 +602,7 @@ def get_details(_media_data):
                 )
             except KeyError:
                 runtime = "NA"
-            return ImdbMovie(
+            movie = ImdbMovie(
                 imdb_id,
                 title,
                 original_title,
@@ -579,14 +611,16 @@ def get_details(_media_data):
                 plot,
                 poster,
                 rated,
-                genre,
+                list_to_string(genre),
                 media_type,
                 release_date,
-                countries,
-                actors,
-                director,
+                list_to_string(countries),
+                list_to_string(actors),
+                list_to_string(director),
                 runtime,
             )
+            movie.names = {**names, "actors": actors, "director": director}
+            return movie
 
         case _:
             return False
@@ -597,16 +631,17 @@ def update_details(_media_data):
         imdb_id, soup, media_info = _media_data[0], _media_data[1], _media_data[2]
     except TypeError:
         return False
+    next_data = _media_data[3] if len(_media_data) > 3 else None
     if not media_info:
         return False
 
-    voters = get_voters(media_info, soup)
+    voters = get_voters(media_info, soup, next_data)
     score = get_score(media_info)
     media_type = media_info["@type"]
     match media_type:
         case "TVSeries":
-            seasons = get_seasons(soup)
-            years = get_series_years(soup)
+            seasons = page_data.get_seasons(next_data) or get_seasons(soup)
+            years = page_data.get_series_years(next_data) or get_series_years(soup)
             return ImdbSerie(
                 imdb_id,
                 "title",
@@ -650,67 +685,185 @@ def update_details(_media_data):
             return False
 
 
-def add_to_database(_media: Imdb):
-    _insert_command = _media.insertion_command()
-    return database_excute_command(_insert_command)
+def add_to_database(_media: Imdb, replace=False):
+    _insert_command, _values = _media.insertion_command(replace)
+    _result = database_excute_command(_insert_command, _params=_values)
+    if _result:
+        for _command, _values in get_index_commands(
+            _media, "replace" if replace else "add"
+        ):
+            database_excute_command(_command, _params=_values)
+    return _result
 
 
 def update_in_database(_media: Imdb):
-    _insert_command = _media.update_command()
-    return database_excute_command(_insert_command)
-
-
-def get_imdb_id(_link):
-    return re.search("https://www.imdb.com/title/(.{10}?|.{9})", _link).group(1)
+    _update_command = _media.update_command()
+    if not _update_command:
+        return False
+    _command, _values = _update_command
+    return database_excute_command(_command, _params=_values)
 
 
 def build_urls_list(_imdb_ids):
-    imdb_base_path = "https://www.imdb.com/title/"
-    return [f"{imdb_base_path}{imdb_id}" for imdb_id in _imdb_ids]
+    return [to_url(imdb_id, IMDB_BASE_PATH) for imdb_id in _imdb_ids]
 
 
-async def gather_with_concurrency(urls, _parallel_requests):
-    conn = aiohttp.TCPConnector(limit_per_host=200, limit=0, ttl_dns_cache=300)
-    headers = {
-        "user-agent": "Mozilla/5.0 (Linux; Android 7.0; SM-G892A Build/NRD90M; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/60.0.3112.107 Mobile Safari/537.36"
-    }
-    semaphore = asyncio.Semaphore(_parallel_requests)
-    session = aiohttp.ClientSession(connector=conn, trust_env=True)
+async def gather_with_concurrency(
+    urls, _parallel_requests, _on_page=None, _on_failure=None, _page_cache=None
+):
+    """fetch every url, the number of requests in flight starts at _parallel_requests and is
+    adapted to the upstream latency and throttling by an AimdLimiter
+
+    Args:
+        urls (iterable): imdb title urls, consumed lazily so it can be a generator
+        _parallel_requests (int): number of requests allowed in flight at the start
+        _on_page (coroutine function, optional): called with an (imdb_id, html bytes, url) tuple as soon as
+            a page arrives, when given nothing is kept in memory. Defaults to None.
+        _on_failure (function, optional): called with (url, error) when a url still fails after
+            FETCH_RETRIES attempts, a failing url never stops the others. Defaults to None.
+        _page_cache (PageCache, optional): pages are stored in it, and a url it already holds is
+            only downloaded again if imdb says it changed since. Defaults to None.
+
+    Returns:
+        list: [(imdb_id, soup)] when _on_page is None, an empty list otherwise
+    """
+    # the session is shared by every call made in this process, it is not closed here
+    session = get_session_manager().get_session()
+    loop = asyncio.get_running_loop()
+    limiter = AimdLimiter(
+        initial_limit=_parallel_requests,
+        max_limit=max(_parallel_requests, MAX_PARALLEL_REQUESTS),
+    )
     results = []
+    # every fetcher pulls its next url from the same iterator
+    _urls = iter(urls)
     # _proxy = next(proxyPool)
     # print(f'{_proxy=}')
 
     # heres the logic for the generator
+    def get_validators(imdb_id):
+        try:
+            return _page_cache.get_validators(imdb_id)
+        except CACHE_ERRORS as e:
+            logger.warning(f"{imdb_id} not looked up in the page cache: {e!r}")
+            return {}
+
+    def read_cached(imdb_id):
+        """the cached page of imdb_id after a 304, None if the cache cannot give it"""
+        try:
+            _page_cache.touch(imdb_id)
+            return _page_cache.get(imdb_id)
+        except CACHE_ERRORS as e:
+            logger.warning(f"{imdb_id} not read from the page cache: {e!r}")
+            return None
+
+    def store(imdb_id, _html, _etag, _last_modified):
+        try:
+            _page_cache.put(imdb_id, _html, _etag, _last_modified)
+        except CACHE_ERRORS as e:
+            # the page was downloaded all the same, it is only not kept
+            logger.warning(f"{imdb_id} not stored in the page cache: {e!r}")
+
+    async def fetch(url, imdb_id, _revalidate=True):
+        _headers = get_validators(imdb_id) if _page_cache and _revalidate else {}
+        await limiter.acquire()
+        _start_time = time.monotonic()
+        _overloaded = True
+        try:
+            async with async_timeout.timeout(20):
+                async with session.get(url, ssl=False, headers=_headers) as response:
+                    _html = await response.read()
+            _overloaded = response.status in OVERLOAD_STATUS
+        finally:
+            await limiter.release(time.monotonic() - _start_time, _overloaded)
+        if _overloaded or response.status >= 400:
+            raise aiohttp.ClientResponseError(
+                response.request_info, (), status=response.status
+            )
+        if _page_cache:
+            if response.status == 304:
+                _html = await loop.run_in_executor(None, read_cached, imdb_id)
+                if _html is None:
+                    # the cached page is gone or unreadable, download it in full
+                    logger.warning(f"{imdb_id} not modified but missing from the page cache")
+                    return await fetch(url, imdb_id, False)
+                return _html
+            await loop.run_in_executor(
+                None,
+                store,
+                imdb_id,
+                _html,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+        return _html
+
     async def get(url):
-        async with semaphore:
-            with async_timeout.timeout(20):
-                async with session.get(url, ssl=False, headers=headers) as response:
-                    obj = BeautifulSoup(await response.read(), "lxml")
-                    results.append((get_imdb_id(url), obj))
-
-    await asyncio.gather(*(get(url) for url in urls))
-    await session.close()
-    await conn.close()
+        # the id is read from the url once, here
+        imdb_id = get_imdb_id(url)
+        _html = None
+        for _attempt in range(FETCH_RETRIES):
+            try:
+                _html = await fetch(url, imdb_id)
+                break
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                _error = (
+                    f"HTTP {e.status}"
+                    if isinstance(e, aiohttp.ClientResponseError)
+                    else repr(e)
+                )
+                # a missing title will not come back by asking again
+                if getattr(e, "status", None) == 404 or _attempt == FETCH_RETRIES - 1:
+                    break
+                await asyncio.sleep(
+                    get_backoff(_attempt, FETCH_BACKOFF_BASE, FETCH_BACKOFF_CAP)
+                )
+        if _html is None:
+            if _on_failure:
+                _on_failure(url, _error)
+            else:
+                logger.warning(f"{url} could not be fetched: {_error}")
+            return
+        # handing the page over happens outside the limiter, a full queue
+        # must not count against the request
+        if _on_page:
+            await _on_page((imdb_id, _html, url))
+        else:
+            results.append((imdb_id, BeautifulSoup(_html, "lxml")))
+
+    async def fetcher():
+        for url in _urls:
+            await get(url)
+
+    # one fetcher per possible slot, the limiter decides how many of them run
+    await asyncio.gather(*(fetcher() for _ in range(limiter.max_limit)))
+    logger.info(f"concurrency limiter stats: {limiter.get_stats()}")
     return results
 
 
+def get_media_info(_soup):
+    _script = _soup.find("script", type="application/ld+json")
+    _script = (
+        str(_script)
+        .replace("</script>", "")
+        .replace('<script type="application/ld+json">', "")
+    )
+    try:
+        return json.loads(_script)
+    except json.decoder.JSONDecodeError:
+        print("Timeout, get_media_info took too long")
+        return None
+
+
 def build_info(_results):
     _build_info = []
     for result in _results:
         imdb_id = result[0]
         soup = result[1]
         if result:
-            _script = soup.find("script", type="application/ld+json")
-            _script = (
-                str(_script)
-                .replace("</script>", "")
-                .replace('<script type="application/ld+json">', "")
-            )
-            try:
-                media_info = json.loads(_script)
+            media_info = get_media_info(soup)
+            if media_info:
                 _build_info.append((imdb_id, soup, media_info))
-            except json.decoder.JSONDecodeError:
-                print("Timeout, get_media_info took too long")
 
     return _build_info
 
@@ -724,48 +877,414 @@ def get_media_data(urls):
     return iter(build_info(results))
 
 
+def parse_page(_page, process_type="add"):
+    """turn a raw page into an Imdb record, the soup is dropped before returning
+
+    Args:
+        _page (tuple): (imdb_id, html bytes, url) with an optional fourth item, the
+            timestamp the page was downloaded at when it is not now.
+        process_type (str, optional): [either add, replace or update]. Defaults to 'add'.
+
+    Returns:
+        Imdb: the details to write, False if the page could not be used
+    """
+    imdb_id, _html = _page[0], _page[1]
+    if FAST_EXTRACTION:
+        # the json blocks are cut out of the raw bytes, the tree is only built
+        # if a field is missing from them
+        media_info = page_data.get_ld_json(_html)
+        next_data = page_data.get_next_data(_html)
+        soup = page_data.LazySoup(_html)
+    else:
+        soup = BeautifulSoup(_html, "lxml")
+        media_info = get_media_info(soup)
+        next_data = None
+    if not media_info:
+        raise ValueError("the page has no ld+json media info")
+    match process_type:
+        case "add" | "replace":
+            details = get_details((imdb_id, soup, media_info, next_data))
+        case "update":
+            details = update_details((imdb_id, soup, media_info, next_data))
+    if details and len(_page) > 3:
+        details.scraped_at = _page[3]
+    return details
+
+
+def parse_page_timed(_page, process_type="add"):
+    """parse_page, also returning the FIELD_TIMINGS and selector hits of the page so the
+    counters of parse processes reach the pipeline"""
+    pop_field_timings()
+    pop_selector_hits()
+    details = parse_page(_page, process_type)
+    return details, pop_field_timings(), pop_selector_hits()
+
+
+def write_item(details, process_type="add"):
+    """write details to the database, returns True if a row was written"""
+    if not details:
+        return False
+    match process_type:
+        case "add":
+            if add_to_database(details):
+                logger.info(f"{details.title} Added to database")
+                return True
+        case "replace":
+            if add_to_database(details, True):
+                logger.info(f"{details.title} Replaced in the database")
+                return True
+        case "update":
+            if update_in_database(details):
+                logger.info(f"{details.title} Updated in the database")
+                return True
+    return False
+
+
+def get_write_command(details, process_type="add"):
+    match process_type:
+        case "add":
+            return details.insertion_command()
+        case "replace":
+            return details.insertion_command(True)
+        case "update":
+            return details.update_command()
+
+
+def get_index_commands(details, process_type="add"):
+    """(statement, parameters) indexing the titles, genres, countries and people of
+    details, an update leaves them as they are"""
+    if not details.SCHEDULED or process_type == "update":
+        return []
+    _commands = search.get_search_commands(details)
+    if dimensions.WRITE_DIMENSIONS:
+        _commands += dimensions.get_dimension_commands(details, process_type == "replace")
+    return _commands
+
+
+def buffer_item(details, process_type="add"):
+    """buffer the write of details, flushed with the next batch of the process
+
+    Returns:
+        tuple: (written, failed) imdb ids of the batch this write flushed, see
+            Database.flush, None when details has nothing to write for process_type
+    """
+    _command = get_write_command(details, process_type)
+    if not _command:
+        return None
+    database = get_database(DATABASE_LOCATION)
+    _written, _failed = database.write(*_command, key=details.imdb_id)
+    for _index_command in get_index_commands(details, process_type):
+        _flushed = database.write(*_index_command)
+        _written, _failed = _written + _flushed[0], _failed + _flushed[1]
+    return _written, _failed
+
+
+def flush_items():
+    """write the buffered items, see Database.flush"""
+    return get_database(DATABASE_LOCATION).flush()
+
+
 def add_item(_media_info):
-    details = get_details(_media_info)
-    if details:
-        insertion_details = add_to_database(details)
-        if insertion_details:
-            logger.info(f"{details.title} Added to database")
+    write_item(get_details(_media_info), "add")
 
 
 def update_item(_media_info):
-    details = update_details(_media_info)
-    if details:
-        insertion_details = update_in_database(details)
-        if insertion_details:
-            logger.info(f"{details.title} Updated in the database")
+    write_item(update_details(_media_info), "update")
+
+
+def clean_ids(_imdb_ids):
+    """the ids of a batch not scraped yet, checked with one query for the whole batch,
+    the ids can be ints or tconsts and are returned as they were given"""
+    _imdb_ids = list(_imdb_ids)
+    if not _imdb_ids:
+        return []
+    _placeholders = ", ".join("?" * len(_imdb_ids))
+    _command = " UNION ALL ".join(
+        f"SELECT imdb_id FROM {_table_name} WHERE imdb_id IN ({_placeholders})"
+        for _table_name in SCRAPED_TABLES
+    )
+    _tconsts = [
+        decode(imdb_id) if isinstance(imdb_id, int) else imdb_id for imdb_id in _imdb_ids
+    ]
+    _rows = get_database(DATABASE_LOCATION).execute(
+        _command, _tconsts * len(SCRAPED_TABLES), "fetch_all"
+    )
+    _scraped_ids = {encode(_row[0]) for _row in _rows}
+    return [imdb_id for imdb_id in _imdb_ids if encode(imdb_id) not in _scraped_ids]
+
+
+def iter_queue_urls(
+    _work_queue, _filter=None, _batch_size=MAX_CHUNK_LENGHT, _stop=None, _base_path=IMDB_BASE_PATH
+):
+    """urls under _base_path of the ids claimed from a WorkQueue, see WorkQueue.iter_claims"""
+    for imdb_id in _work_queue.iter_claims(_batch_size, _filter, _stop):
+        yield to_url(imdb_id, _base_path)
 
 
 def clean_urls(_raw_urls):
-    urls = (url for url in _raw_urls if not check_item_exists(get_imdb_id(url)))
+    _scraped_ids = get_scraped_ids()
+    urls = [url for url in _raw_urls if get_imdb_id(url) not in _scraped_ids]
     if not urls:
         return None
-    return list(urls)
+    return urls
+
+
+async def run_pipeline(
+    urls,
+    process_type="add",
+    parse_executor=None,
+    parse_workers=PARSE_WORKERS,
+    retry_store=None,
+    page_cache=None,
+    page_source=None,
+    work_queue=None,
+    writer=None,
+):
+    """fetch, parse and write stages linked by bounded queues
+
+    pages are parsed as soon as they arrive and records are written as soon as
+    they are parsed, so at most PAGE_QUEUE_SIZE raw pages and RECORD_QUEUE_SIZE
+    records are held at any time whatever the number of urls.
 
+    Args:
+        urls (iterable): imdb title urls, consumed lazily
+        process_type (str, optional): [either add, replace or update]. Defaults to 'add'.
+        parse_executor (Executor, optional): where parse_page runs, a ProcessPoolExecutor
+            spreads parsing over several cores. Defaults to the loop thread pool.
+        parse_workers (int, optional): number of pages handed to parse_executor at the same time.
+        retry_store (RetryStore, optional): keeps the urls that failed to be fetched or parsed, the
+            due urls it claims are scraped before urls.
+        page_cache (PageCache, optional): see gather_with_concurrency.
+        page_source (coroutine function, optional): replaces the fetch stage, called with
+            (on_page, on_failure) it must hand every page to on_page.
+        work_queue (WorkQueue, optional): the queue urls were claimed from, every id is marked
+            done once written or failed once given up on.
+        writer (WriterService, optional): the records are handed to it instead of being
+            written from this process, it marks them in work_queue once committed.
+
+    Returns:
+        dict: pages parsed, rows written or failed, records handed over to writer and
+            the seconds spent in each stage
+    """
+    loop = asyncio.get_running_loop()
+    page_queue = asyncio.Queue(maxsize=max(PAGE_QUEUE_SIZE, parse_workers))
+    record_queue = asyncio.Queue(maxsize=RECORD_QUEUE_SIZE)
+    # writes are buffered and flushed in batches from this one thread
+    write_executor = ThreadPoolExecutor(max_workers=1)
+    stats = {
+        "pages": 0,
+        "parse_failures": 0,
+        "parse_seconds": 0.0,
+        "rows": 0,
+        "write_failures": 0,
+        # records handed to the writer, its own stats tell which were committed
+        "handed_over": 0,
+        "write_seconds": 0.0,
+        # per field [calls, seconds]
+        "fields": {},
+        # per selector name, hits of each of its selectors then misses
+        "selectors": {},
+    }
 
-def process(urls, process_type="add"):
-    logger.info(f"Media gathering, please wait")
-    _media_infos = get_media_data(urls)
-    del urls
-    gc.collect()
-    for index, _media_info in enumerate(_media_infos):
-        imdb_id = _media_info[0]
-        logger.info(f"Processing: {index+1}/{imdb_id}")
+    async def parse_stage():
+        while (_page := await page_queue.get()) is not STAGE_DONE:
+            start_time = time.time()
+            try:
+                details, _field_timings, _selector_hits = await loop.run_in_executor(
+                    parse_executor, parse_page_timed, _page, process_type
+                )
+                add_selector_hits(stats["selectors"], _selector_hits)
+                for _field, (_calls, _seconds) in _field_timings.items():
+                    _timing = stats["fields"].setdefault(_field, [0, 0.0])
+                    _timing[0] += _calls
+                    _timing[1] += _seconds
+            except Exception as e:
+                logger.warning(f"{_page[0]} could not be parsed: {e!r}")
+                stats["parse_failures"] += 1
+                stats["pages"] += 1
+                stats["parse_seconds"] += time.time() - start_time
+                if retry_store:
+                    retry_store.add_failure(_page[2], repr(e))
+                if work_queue:
+                    work_queue.fail(_page[0])
+                # failed, not done, the id is scraped again with the next retries
+                continue
+            if retry_store:
+                retry_store.resolve(_page[2])
+            stats["pages"] += 1
+            stats["parse_seconds"] += time.time() - start_time
+            logger.info(
+                f"Parsed: {_page[0]} --- {(time.time() - start_time)} seconds ---"
+            )
+            if details:
+                await record_queue.put(details)
+            elif work_queue:
+                work_queue.complete(_page[0])
+
+    def account_flush(_flushed):
+        # an id is only marked done once its row is committed
+        _written, _failed = _flushed
+        stats["rows"] += len(_written)
+        stats["write_failures"] += len(_failed)
+        if _written:
+            logger.info(f"{len(_written)} rows written to the database")
+        if work_queue:
+            for imdb_id in _written:
+                work_queue.complete(imdb_id)
+            for imdb_id in _failed:
+                work_queue.fail(imdb_id)
+
+    async def write_stage():
+        while (details := await record_queue.get()) is not STAGE_DONE:
+            start_time = time.time()
+            if writer:
+                # blocks while the writer is behind, the stages before wait on their queues
+                await loop.run_in_executor(
+                    write_executor, writer.put, details, process_type, bool(work_queue)
+                )
+                stats["handed_over"] += 1
+                stats["write_seconds"] += time.time() - start_time
+                continue
+            _flushed = await loop.run_in_executor(
+                write_executor, buffer_item, details, process_type
+            )
+            if _flushed is None:
+                if work_queue:
+                    work_queue.complete(details.imdb_id)
+            else:
+                account_flush(_flushed)
+            stats["write_seconds"] += time.time() - start_time
         start_time = time.time()
-        match process_type:
-            case "add":
-                add_item(_media_info)
-            case "update":
-                update_item(_media_info)
-        logger.info(f"--- {(time.time() - start_time)} seconds ---")
-    #logger.info("sleep for 2 seconds")
-    del _media_infos
+        account_flush(await loop.run_in_executor(write_executor, flush_items))
+        stats["write_seconds"] += time.time() - start_time
+
+    parsers = [asyncio.create_task(parse_stage()) for _ in range(parse_workers)]
+    write_task = asyncio.create_task(write_stage())
+    if retry_store:
+        urls = itertools.chain(retry_store.claim_due_urls(), urls)
+
+    def on_failure(url, error):
+        if retry_store:
+            retry_store.add_failure(url, error)
+        if work_queue:
+            work_queue.fail(get_imdb_id(url))
+
+    if page_source is None:
+
+        def page_source(_on_page, _on_failure):
+            return gather_with_concurrency(
+                urls, PARALLEL_REQUESTS, _on_page, _on_failure, page_cache
+            )
+
+    async def unless_write_failed(_awaitable):
+        """await _awaitable, unless the write stage ends first: it failed, nothing takes
+        the records any more and every stage before it would wait forever on its queue"""
+        _task = asyncio.ensure_future(_awaitable)
+        await asyncio.wait({_task, write_task}, return_when=asyncio.FIRST_COMPLETED)
+        if _task.done():
+            return _task.result()
+        for _pending in (_task, *parsers):
+            _pending.cancel()
+        await asyncio.gather(_task, *parsers, return_exceptions=True)
+        # the ids claimed and not written stay leased, claimed again once it expires
+        write_task.result()
+        raise RuntimeError("the write stage ended before the pages were written")
+
+    try:
+        await unless_write_failed(page_source(page_queue.put, on_failure))
+    finally:
+        try:
+            if not write_task.done():
+                for _ in parsers:
+                    await unless_write_failed(page_queue.put(STAGE_DONE))
+                await unless_write_failed(asyncio.gather(*parsers))
+                await unless_write_failed(record_queue.put(STAGE_DONE))
+            await write_task
+        finally:
+            write_executor.shutdown()
+    return stats
+
+
+def process(
+    urls,
+    process_type="add",
+    workers=None,
+    use_page_cache=False,
+    work_queue=None,
+    writer=None,
+):
+    """scrape urls with a single fetcher feeding a pool of parse processes
+
+    Args:
+        urls (iterable): imdb title urls, consumed lazily
+        process_type (str, optional): [either add, replace or update]. Defaults to 'add'.
+        workers (int, optional): number of parse processes. Defaults to the cpu count.
+        use_page_cache (bool, optional): keep raw pages in the PageCache and revalidate them
+            instead of downloading them again. Defaults to False.
+        work_queue (WorkQueue, optional): see run_pipeline.
+        writer (WriterService, optional): see run_pipeline.
+
+    Returns:
+        dict: the stats of run_pipeline
+    """
+    logger.info(f"Media gathering, please wait")
+    workers = workers or os.cpu_count() or 1
+    retry_store = RetryStore(process_type)
+    page_cache = PageCache() if use_page_cache else None
+
+    async def _run():
+        try:
+            return await run_pipeline(
+                urls,
+                process_type,
+                parse_executor,
+                workers,
+                retry_store,
+                page_cache,
+                work_queue=work_queue,
+                writer=writer,
+            )
+        finally:
+            await get_session_manager().close()
+
+    with ProcessPoolExecutor(max_workers=workers) as parse_executor:
+        stats = asyncio.run(_run())
+    retry_store.close()
+    if work_queue:
+        work_queue.flush()
+    if page_cache:
+        logger.info(f"page cache stats: {page_cache.stats}")
+        page_cache.close()
     gc.collect()
-    # time.sleep(2)
+    return stats
+
+
+def reparse_cached_pages(process_type="replace", workers=None):
+    """run the parse and write stages over every page of the PageCache, without any network
+
+    Args:
+        process_type (str, optional): [either add, replace or update]. Defaults to 'replace'
+            so rows written by older extractors are overwritten.
+        workers (int, optional): number of parse processes. Defaults to the cpu count.
+    """
+    workers = workers or os.cpu_count() or 1
+    page_cache = PageCache()
+
+    async def _cached_pages(_on_page, _on_failure):
+        loop = asyncio.get_running_loop()
+        for imdb_id, _fetched_at in page_cache.iter_fetched():
+            _html = await loop.run_in_executor(None, page_cache.get, imdb_id)
+            if _html is not None:
+                # the rows are as old as their page, not as the reparse
+                await _on_page((imdb_id, _html, build_urls_list([imdb_id])[0], _fetched_at))
+
+    with ProcessPoolExecutor(max_workers=workers) as parse_executor:
+        asyncio.run(
+            run_pipeline(
+                [], process_type, parse_executor, workers, page_source=_cached_pages
+            )
+        )
+    page_cache.close()
 
 
 def slice_list(_list):
@@ -773,12 +1292,21 @@ def slice_list(_list):
     return [_list[:half], _list[half:]]
 
 
-def single_scrape(imdb_id):
+async def single_scrape(imdb_id):
+    """scrape and add a single title, reusing the pooled session of the process"""
     set_up_database()
-    imdb_base_path = "https://www.imdb.com/title/"
-    url = f"{imdb_base_path}{imdb_id}"
-    _media_info = get_media_data([url])
-    add_item(_media_info)
+    url = to_url(imdb_id, IMDB_BASE_PATH)
+    _pages = []
+
+    async def _on_page(_page):
+        _pages.append(_page)
+
+    await gather_with_concurrency([url], 1, _on_page)
+    for _page in _pages:
+        try:
+            write_item(parse_page(_page, "add"), "add")
+        except ValueError as e:
+            logger.warning(f"{imdb_id} could not be parsed: {e!r}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+# one sqlite connection per process and database, in WAL mode, with writes buffered and
+# flushed in a single transaction per batch instead of a connect and a commit per row
+import atexit
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+
+from imdb_scrapper.lib import dimensions, scheduler, search
+
+# seconds a statement waits for another process holding the write lock
+DATABASE_TIMEOUT = 60
+# statements buffered before they are flushed in one transaction
+WRITE_BATCH = 200
+PRAGMAS = {
+    "journal_mode": "WAL",
+    # with WAL a commit only waits for the log, a power cut may lose the last
+    # transactions but never corrupts the database
+    "synchronous": "NORMAL",
+    # negative is KiB: 64 MiB of page cache
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    """a connection shared by the threads of a process, every call holds its lock"""
+
+    def __init__(self, location):
+        self.location = location
+        self._connection = sqlite3.connect(
+            location, timeout=DATABASE_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        for _pragma, _value in PRAGMAS.items():
+            self._connection.execute(f"PRAGMA {_pragma}={_value}")
+        scheduler.register_functions(self._connection)
+        dimensions.register_functions(self._connection)
+        search.register_functions(self._connection)
+        self._lock = threading.RLock()
+        # (command, params, key), key is None for the statements nobody waits for
+        self._pending = []
+        # keys flushed but not returned yet by write or flush, a read flushes too
+        self._written = []
+        self._failed = []
+
+    def execute(self, command, params=(), fetch_type="none"):
+        """run one statement right away, in its own transaction
+
+        Args:
+            command (str): the sql command
+            params (tuple, optional): its parameters. Defaults to ().
+            fetch_type (str, optional): [either none, fetch_one or fetch_all]. Defaults to 'none'.
+
+        Raises:
+            sqlite3.Error: the statement failed
+        """
+        with self._lock:
+            # the buffered writes go first, a read must see them
+            self._flush()
+            _cursor = self._connection.execute(command, params)
+            match fetch_type.lower():
+                case "fetch_one":
+                    return _cursor.fetchone()
+                case "fetch_all":
+                    return _cursor.fetchall()
+            return _cursor
+
+    def cursor(self, command, params=()):
+        """a cursor over the rows of command, read with fetchmany for large results"""
+        with self._lock:
+            self._flush()
+            return self._connection.execute(command, params)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """the connection inside one transaction, committed when the block ends and rolled
+        back if it raises, for the writes that read their own results on the way
+
+        Yields:
+            sqlite3.Connection: the connection of the process, the lock is held meanwhile
+        """
+        with self._lock:
+            self._flush()
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def write(self, command, params=(), key=None):
+        """buffer a statement, flushed with the next WRITE_BATCH ones
+
+        Returns:
+            tuple: see flush, both lists are empty while nothing was flushed
+        """
+        with self._lock:
+            self._pending.append((command, params, key))
+            if len(self._pending) >= WRITE_BATCH:
+                return self.flush()
+            return self._pop_flushed()
+
+    def flush(self):
+        """write every buffered statement in one transaction
+
+        Returns:
+            tuple: (keys written, keys failed) of the statements flushed since the
+                last call returning them
+        """
+        with self._lock:
+            self._flush()
+            return self._pop_flushed()
+
+    def _pop_flushed(self):
+        _flushed = self._written, self._failed
+        self._written, self._failed = [], []
+        return _flushed
+
+    def _flush(self):
+        """consecutive statements sharing the same command go through a single
+        executemany. when the transaction fails the statements are written one by
+        one so a bad row does not lose the others."""
+        with self._lock:
+            _pending, self._pending = self._pending, []
+            if not _pending:
+                return
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+                _start = 0
+                for _index in range(1, len(_pending) + 1):
+                    if _index == len(_pending) or _pending[_index][0] != _pending[_start][0]:
+                        self._connection.executemany(
+                            _pending[_start][0],
+                            [_params for _command, _params, _key in _pending[_start:_index]],
+                        )
+                        _start = _index
+                self._connection.execute("COMMIT")
+                self._written.extend(
+                    _key for _command, _params, _key in _pending if _key is not None
+                )
+                return
+            except sqlite3.Error as e:
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+                logger.warning(f"batch of {len(_pending)} writes failed ({e}), writing them one by one")
+            for _command, _params, _key in _pending:
+                try:
+                    self._connection.execute(_command, _params)
+                    _flushed = self._written
+                except sqlite3.Error as e:
+                    logger.warning(_command)
+                    logger.warning(e)
+                    _flushed = self._failed
+                if _key is not None:
+                    _flushed.append(_key)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+
+# (pid, location) -> Database, a forked process opens its own
+_databases = {}
+
+
+def get_database(location):
+    """the Database of the current process for location"""
+    _key = (os.getpid(), location)
+    if _key not in _databases:
+        _databases[_key] = Database(location)
+    return _databases[_key]
+
+
+def close_databases():
+    """flush and close the databases opened by the current process"""
+    _pid = os.getpid()
+    for _key in [_key for _key in _databases if _key[0] == _pid]:
+        _databases.pop(_key).close()
+
+
+atexit.register(close_databases)
+
+
+if __name__ == "__main__":
+    print("this is a library to access the sqlite database")
@@ -0,0 +1,172 @@
+# genres, countries and people of the titles, each name stored once in a dictionary table
+# with an integer id and linked to the titles by a junction table indexed both ways, so a
+# title can be filtered on them through an index instead of matching the joined strings
+import json
+
+# write the junction rows of every record added, next to its joined strings
+WRITE_DIMENSIONS = True
+# separator of the names in the string columns
+NAME_SEPARATOR = ","
+# (dimension, role, column of the detail tables holding its names), role is None
+# for the dimensions that have no role
+DIMENSION_COLUMNS = (
+    ("genre", None, "genre"),
+    ("country", None, "countries"),
+    ("person", "actor", "actors"),
+    ("person", "director", "director"),
+    ("person", "creator", "creator"),
+)
+# names written by the extractors that are not a name
+NOT_NAMES = {"NA", "This was created by an Organization"}
+
+
+def clean_names(_names):
+    """the names of a list, in order and without duplicates"""
+    _stripped = (_name.strip() for _name in _names or () if isinstance(_name, str))
+    return list(dict.fromkeys(_name for _name in _stripped if _name and _name not in NOT_NAMES))
+
+
+def split_names(_names):
+    """the names of a string column, in order and without duplicates. a name holding the
+    separator, Korea, South, is split in two, so it only reads the rows scraped before the
+    junction rows were written from the lists of the parser"""
+    if not isinstance(_names, str):
+        return []
+    return clean_names(_names.split(NAME_SEPARATOR))
+
+
+def register_functions(_connection):
+    """split_names(names) in sql, the names as a json array read with json_each"""
+    _connection.create_function(
+        "split_names", 1, lambda _names: json.dumps(split_names(_names)), deterministic=True
+    )
+
+
+def create_tables(_database):
+    for _dimension in dict.fromkeys(_row[0] for _row in DIMENSION_COLUMNS):
+        _role = ", role TEXT NOT NULL" if _dimension == "person" else ""
+        _key = ", role" if _dimension == "person" else ""
+        _database.execute(
+            f"""CREATE TABLE IF NOT EXISTS {_dimension} ({_dimension}_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE)"""
+        )
+        _database.execute(
+            f"""CREATE TABLE IF NOT EXISTS title_{_dimension} ({_dimension}_id INT NOT NULL,
+            imdb_id TEXT NOT NULL{_role}, PRIMARY KEY ({_dimension}_id, imdb_id{_key})) WITHOUT ROWID"""
+        )
+        _database.execute(
+            f"CREATE INDEX IF NOT EXISTS title_{_dimension}_imdb_id ON title_{_dimension} (imdb_id)"
+        )
+
+
+def _get_role_columns(_role):
+    """(column list, value list, condition) adding the role of a junction row"""
+    if _role is None:
+        return "", "", ""
+    return ", role", ", ?", " AND role = ?"
+
+
+def get_dimension_commands(details, replace=False):
+    """(statement, parameters) writing the junction rows of a record from the names its
+    parser listed, its previous ones are removed first when it replaces a row. the
+    statements are the same for every record of a class so a batch of records runs them
+    through executemany
+
+    Args:
+        details (Imdb): the record, its names set by the parser
+        replace (bool, optional): the record replaces a row. Defaults to False.
+    """
+    _commands = []
+    _listed_names = details.names or {}
+    for _dimension, _role, _column in DIMENSION_COLUMNS:
+        if _column not in details.__dataclass_fields__:
+            continue
+        _role_columns, _role_values, _role_condition = _get_role_columns(_role)
+        _roles = () if _role is None else (_role,)
+        _names = json.dumps(clean_names(_listed_names.get(_column)))
+        if replace:
+            _commands.append(
+                (
+                    f"DELETE FROM title_{_dimension} WHERE imdb_id = ?{_role_condition}",
+                    (details.imdb_id, *_roles),
+                )
+            )
+        _commands.append(
+            (f"INSERT OR IGNORE INTO {_dimension} (name) SELECT value FROM json_each(?)", (_names,))
+        )
+        _commands.append(
+            (
+                f"""INSERT OR IGNORE INTO title_{_dimension} ({_dimension}_id, imdb_id{_role_columns})
+                SELECT {_dimension}_id, ?{_role_values} FROM {_dimension}
+                WHERE name IN (SELECT value FROM json_each(?))""",
+                (details.imdb_id, *_roles, _names),
+            )
+        )
+    return _commands
+
+
+def copy_titles(_connection, _source, _imdb_ids):
+    """replace the junction rows of some titles by those of an attached database, their
+    names are looked up again since both databases numbered them on their own
+
+    Args:
+        _connection (sqlite3.Connection): the database copied to, _source attached to it
+        _source (str): schema name of the attached database
+        _imdb_ids (str): sql query of the ids of the titles copied
+    """
+    for _dimension in dict.fromkeys(_row[0] for _row in DIMENSION_COLUMNS):
+        _role_column, _role_value = (", role", ", titles.role") if _dimension == "person" else ("", "")
+        _connection.execute(f"DELETE FROM main.title_{_dimension} WHERE imdb_id IN ({_imdb_ids})")
+        _connection.execute(
+            f"""INSERT OR IGNORE INTO main.{_dimension} (name) SELECT names.name
+            FROM {_source}.title_{_dimension} AS titles JOIN {_source}.{_dimension} AS names
+            USING ({_dimension}_id) WHERE titles.imdb_id IN ({_imdb_ids})"""
+        )
+        _connection.execute(
+            f"""INSERT OR IGNORE INTO main.title_{_dimension} ({_dimension}_id, imdb_id{_role_column})
+            SELECT copied.{_dimension}_id, titles.imdb_id{_role_value}
+            FROM {_source}.title_{_dimension} AS titles JOIN {_source}.{_dimension} AS names
+            USING ({_dimension}_id) JOIN main.{_dimension} AS copied ON copied.name = names.name
+            WHERE titles.imdb_id IN ({_imdb_ids})"""
+        )
+
+
+def index_titles(_connection, _table_name, _condition="true", _params=()):
+    """rebuild, from the string columns, the junction rows of the titles of _table_name
+    matching _condition, for the rows scraped before the junction tables existed
+
+    Args:
+        _connection (Database or sqlite3.Connection): split_names registered on it
+        _table_name (str): a detail table, aliased details in _condition
+        _condition (str, optional): sql condition on details. Defaults to every title.
+        _params (tuple, optional): parameters of _condition. Defaults to ().
+    """
+    _columns = {
+        _row[1] for _row in _connection.execute(f"PRAGMA table_info({_table_name})").fetchall()
+    }
+    for _dimension, _role, _column in DIMENSION_COLUMNS:
+        if _column not in _columns:
+            continue
+        _role_columns, _role_values, _role_condition = _get_role_columns(_role)
+        _roles = () if _role is None else (_role,)
+        _names = f"{_table_name} AS details, json_each(split_names(details.{_column})) AS names"
+        _connection.execute(
+            f"""DELETE FROM title_{_dimension} WHERE imdb_id IN
+            (SELECT imdb_id FROM {_table_name} AS details WHERE {_condition}){_role_condition}""",
+            (*_params, *_roles),
+        )
+        _connection.execute(
+            f"""INSERT OR IGNORE INTO {_dimension} (name)
+            SELECT DISTINCT names.value FROM {_names} WHERE {_condition}""",
+            _params,
+        )
+        _connection.execute(
+            f"""INSERT OR IGNORE INTO title_{_dimension} ({_dimension}_id, imdb_id{_role_columns})
+            SELECT {_dimension}.{_dimension}_id, details.imdb_id{_role_values} FROM {_names}
+            JOIN {_dimension} ON {_dimension}.name = names.value WHERE {_condition}""",
+            (*_roles, *_params),
+        )
+
+
+if __name__ == "__main__":
+    print("this is a library to store the genres, countries and people of the titles")
@@ -1,5 +1,14 @@
+import functools
+import time
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass
+
+from imdb_scrapper.lib.migrations import NA
+from imdb_scrapper.lib.scheduler import (
+    SCHEDULE_COLUMNS,
+    get_next_due_at,
+    get_release_year,
+)
 
 
 @dataclass
@@ -18,11 +27,70 @@ class Imdb(ABC):
     countries: str
     actors: str
 
-    def insertion_command(self) -> str:
-        ...
+    # the table of the record, its fields are its columns in the same order
+    TABLE = None
+    # columns written by update_command, none when a record is never updated
+    UPDATE_COLUMNS = ()
+    # the table has release_year, last_scraped_at and next_due_at
+    SCHEDULED = True
+    # column -> list of the names joined in it, set by the parser, not a column itself
+    names = None
+    # timestamp of the page the record was read from when it is not the time of the write
+    scraped_at = None
+
+    @classmethod
+    def get_columns(cls):
+        return tuple(cls.__dataclass_fields__) + (
+            ("release_year",) + tuple(SCHEDULE_COLUMNS) if cls.SCHEDULED else ()
+        )
+
+    @staticmethod
+    def get_values(_values):
+        """the fields not found on the page are stored as NULL"""
+        return tuple(None if _value == NA else _value for _value in _values)
+
+    @classmethod
+    @functools.cache
+    def insertion_statement(cls, replace=False) -> str:
+        """the same text for every record of the class, sqlite compiles it once"""
+        _columns = cls.get_columns()
+        return f"""INSERT {"OR REPLACE " if replace else ""}INTO {cls.TABLE} ({", ".join(_columns)})
+            VALUES ({", ".join("?" * len(_columns))})"""
+
+    @classmethod
+    @functools.cache
+    def update_statement(cls) -> str:
+        """next_due_at reads voters and last_scraped_at of the row before they are replaced"""
+        _assignments = ", ".join(f"{_column} = ?" for _column in cls.UPDATE_COLUMNS)
+        return f"""UPDATE {cls.TABLE} SET {_assignments}, last_scraped_at = ?, failed_refreshes = 0,
+            next_due_at = next_due_at(release_date, voters, ?, last_scraped_at, ?) WHERE imdb_id = ?"""
+
+    def insertion_values(self) -> tuple:
+        _values = self.get_values(astuple(self))
+        if not self.SCHEDULED:
+            return _values
+        _now = self.scraped_at or time.time()
+        return _values + (
+            get_release_year(self.release_date),
+            _now,
+            get_next_due_at(self.release_date, None, self.voters, None, _now),
+        )
 
-    def update_command(self) -> str:
-        ...
+    def update_values(self) -> tuple:
+        _now = time.time()
+        return self.get_values(
+            tuple(getattr(self, _column) for _column in self.UPDATE_COLUMNS)
+        ) + (_now, self.get_values((self.voters,))[0], _now, self.imdb_id)
+
+    def insertion_command(self, replace=False) -> tuple:
+        """(statement, parameters) adding the record"""
+        return self.insertion_statement(replace), self.insertion_values()
+
+    def update_command(self) -> tuple:
+        """(statement, parameters) refreshing the record, None if it is never updated"""
+        if not self.UPDATE_COLUMNS:
+            return None
+        return self.update_statement(), self.update_values()
 
 
 @dataclass
@@ -32,20 +100,8 @@ class ImdbSerie(Imdb):
     years: str
     seasons: str
 
-    def insertion_command(self) -> str:
-        _insert_command = f"""INSERT INTO serie_details VALUES 
-                            ("{self.imdb_id}", "{self.title}", "{self.original_title}", "{self.score}", 
-                            "{self.voters}", "{self.plot}", "{self.poster}", "{self.rated}", 
-                            "{self.genre}", "{self.media_type}", "{self.release_date}", "{self.countries}", "{self.actors}", 
-                            "{self.creator}", "{self.runtime}", "{self.years}", "{self.seasons}")"""
-        return _insert_command
-
-    def update_command(self) -> str:
-        update_command = f"""
-                        UPDATE serie_details SET score = {self.score}, voters = {self.voters}, 
-                        years = "{self.years}", seasons = "{self.seasons}" where imdb_id = "{self.imdb_id}"
-                        """
-        return update_command
+    TABLE = "serie_details"
+    UPDATE_COLUMNS = ("score", "voters", "years", "seasons")
 
 
 @dataclass
@@ -53,26 +109,19 @@ class ImdbMovie(Imdb):
     director: str
     runtime: str
 
-    def insertion_command(self):
-        _insert_command = f"""INSERT INTO movie_details VALUES 
-                            ("{self.imdb_id}", "{self.title}", "{self.original_title}", "{self.score}", 
-                            "{self.voters}", "{self.plot}", "{self.poster}", "{self.rated}", 
-                            "{self.genre}", "{self.media_type}", "{self.release_date}", "{self.countries}", 
-                            "{self.actors}", "{self.director}", "{self.runtime}")"""
-        return _insert_command
-
-    def update_command(self) -> str:
-        update_command = f"""
-                            UPDATE movie_details SET score = {self.score}, voters = {self.voters} where imdb_id = "{self.imdb_id}"
-                        """
-        return update_command
+    TABLE = "movie_details"
+    UPDATE_COLUMNS = ("score", "voters")
 
 
 @dataclass
 class ImdbEpisode(Imdb):
-    def insertion_command(self):
-        _insert_command = f"""INSERT INTO episode_details VALUES ("{self.imdb_id}")"""
-        return _insert_command
+    TABLE = "episode_details"
+    SCHEDULED = False
+
+    @classmethod
+    def get_columns(cls):
+        # only the id of an episode is kept
+        return ("imdb_id",)
 
-    def update_command(self) -> str:
-        pass
+    def insertion_values(self) -> tuple:
+        return (self.imdb_id,)
@@ -0,0 +1,103 @@
+# additive increase / multiplicative decrease limit on the number of requests in flight,
+# grows while imdb answers quickly and backs off on timeouts, 429 and 503
+import asyncio
+import logging
+import time
+
+# status codes imdb uses when it is throttling us
+OVERLOAD_STATUS = (429, 503)
+
+logger = logging.getLogger(__name__)
+
+
+class AimdLimiter:
+    """bounds the requests in flight with a window that adapts to the upstream
+
+    every successful request grows the window by increase / window (about +increase
+    per window worth of requests). a timeout, a throttling status or a latency above
+    latency_tolerance times the best latency seen shrinks it by decrease, at most
+    once per smoothed round trip so one burst of failures only counts once.
+    """
+
+    def __init__(
+        self,
+        initial_limit=10,
+        min_limit=1,
+        max_limit=200,
+        increase=1,
+        decrease=0.5,
+        latency_tolerance=3,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.min_latency = None
+        self.smoothed_latency = None
+        self._last_decrease = 0
+        self._condition = asyncio.Condition()
+        self.stats = {"success": 0, "overload": 0, "slow": 0}
+
+    @property
+    def window(self):
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.window)
+            self.in_flight += 1
+
+    async def release(self, _latency, _overloaded=False):
+        """give back a slot and adapt the window
+
+        Args:
+            _latency (float): seconds the request took
+            _overloaded (bool, optional): the request timed out or was throttled.
+        """
+        self._record(_latency, _overloaded)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _record(self, _latency, _overloaded):
+        if not _overloaded:
+            self.min_latency = min(self.min_latency or _latency, _latency)
+            self.smoothed_latency = (
+                _latency
+                if self.smoothed_latency is None
+                else 0.9 * self.smoothed_latency + 0.1 * _latency
+            )
+        if _overloaded:
+            self.stats["overload"] += 1
+            self._decrease()
+        elif _latency > self.latency_tolerance * self.min_latency:
+            self.stats["slow"] += 1
+            self._decrease()
+        else:
+            self.stats["success"] += 1
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def _decrease(self):
+        _now = time.monotonic()
+        if _now - self._last_decrease < (self.smoothed_latency or 0):
+            return
+        self._last_decrease = _now
+        _previous = self.window
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        logger.info(f"concurrency window lowered from {_previous} to {self.window}")
+
+    def get_stats(self):
+        return {
+            "window": self.window,
+            "in_flight": self.in_flight,
+            "min_latency": self.min_latency,
+            "smoothed_latency": self.smoothed_latency,
+            **self.stats,
+        }
+
+
+if __name__ == "__main__":
+    print("this is a library to adapt the number of requests in flight")
@@ -0,0 +1,191 @@
+# numbered changes of the schema of the imdb database. the version a database reached is
+# kept in its PRAGMA user_version, so each migration runs once and in place, and the rows
+# are rewritten in batches of rowids instead of one transaction over the whole table
+import logging
+import time
+
+from imdb_scrapper.lib.dimensions import create_tables, index_titles
+from imdb_scrapper.lib.scheduler import SCHEDULE_COLUMNS
+from imdb_scrapper.lib.search import create_table, index_search
+
+# tables holding the details of a title, episode_details only keeps ids
+DETAIL_TABLES = ("movie_details", "serie_details")
+# rows rewritten per transaction by a migration
+MIGRATION_BATCH = 10000
+# written by the extractors when a field was not found, stored as NULL
+NA = "NA"
+# name -> columns of the indexes of every detail table, they follow the filters and the
+# sort orders of the api so its queries walk an index instead of sorting the table
+DETAIL_INDEXES = {
+    "voters_score": "voters DESC, score DESC",
+    "score_voters": "score DESC, voters DESC",
+    "release_year": "release_year, voters DESC, score DESC",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_columns(_database, _table_name):
+    """column name -> declared type of a table"""
+    _rows = _database.execute(f"PRAGMA table_info({_table_name})", fetch_type="fetch_all")
+    return {_row[1]: _row[2].upper() for _row in _rows}
+
+
+def add_column(_database, _table_name, _column, _type):
+    """add a column unless the table already has it
+
+    Returns:
+        bool: True if it was added
+    """
+    if _column in get_columns(_database, _table_name):
+        return False
+    logger.info(f"adding {_column} to {_table_name}")
+    _database.execute(f"ALTER TABLE {_table_name} ADD COLUMN {_column} {_type}")
+    return True
+
+
+def get_rowid_batches(_database, _table_name):
+    """(first, last + 1) rowids of every MIGRATION_BATCH rowids of a table, rewritten one
+    batch per transaction so the other writers are not locked out for the whole table"""
+    _last_rowid = _database.execute(
+        f"SELECT max(rowid) FROM {_table_name}", fetch_type="fetch_one"
+    )[0]
+    return [
+        (_start, _start + MIGRATION_BATCH)
+        for _start in range(0, (_last_rowid or 0) + 1, MIGRATION_BATCH)
+    ]
+
+
+def update_in_batches(_database, _table_name, _assignments, _params=()):
+    """run UPDATE _table_name SET _assignments over every row, see get_rowid_batches
+
+    Returns:
+        int: rows updated
+    """
+    _updated = 0
+    for _batch in get_rowid_batches(_database, _table_name):
+        _updated += _database.execute(
+            f"UPDATE {_table_name} SET {_assignments} WHERE rowid >= ? AND rowid < ?",
+            (*_params, *_batch),
+        ).rowcount
+    return _updated
+
+
+def add_schedule_columns(_database):
+    """last_scraped_at and next_due_at, the rows scraped before get a next_due_at
+    from their release date alone"""
+    for _table_name in DETAIL_TABLES:
+        _added = [
+            add_column(_database, _table_name, _column, _type)
+            for _column, _type in SCHEDULE_COLUMNS.items()
+        ]
+        _database.execute(
+            f"CREATE INDEX IF NOT EXISTS {_table_name}_next_due_at ON {_table_name} (next_due_at)"
+        )
+        if any(_added):
+            update_in_batches(
+                _database,
+                _table_name,
+                "next_due_at = next_due_at(release_date, NULL, voters, NULL, ?)",
+                (time.time(),),
+            )
+
+
+def add_release_year(_database):
+    """an integer release_year read from the free text release_date, and NULL instead
+    of NA in every column. score and voters hold numbers or NULL, a score of -1 was a
+    title without rating"""
+    for _table_name in DETAIL_TABLES:
+        add_column(_database, _table_name, "release_year", "INT")
+        _text_columns = [
+            _column
+            for _column, _type in get_columns(_database, _table_name).items()
+            if _type == "TEXT" and _column != "imdb_id"
+        ]
+        _assignments = ", ".join(
+            [
+                "release_year = release_year(release_date)",
+                """score = CASE WHEN typeof(score) IN ('integer', 'real') AND score >= 0
+                THEN score END""",
+                """voters = CASE WHEN typeof(voters) IN ('integer', 'real')
+                THEN CAST(voters AS INT) END""",
+            ]
+            + [f"{_column} = NULLIF({_column}, '{NA}')" for _column in _text_columns]
+        )
+        _updated = update_in_batches(_database, _table_name, _assignments)
+        logger.info(f"{_updated} rows of {_table_name} normalized")
+
+
+def add_detail_indexes(_database):
+    for _table_name in DETAIL_TABLES:
+        for _name, _columns in DETAIL_INDEXES.items():
+            logger.info(f"creating index {_table_name}_{_name}")
+            _database.execute(
+                f"CREATE INDEX IF NOT EXISTS {_table_name}_{_name} ON {_table_name} ({_columns})"
+            )
+    _database.execute("ANALYZE")
+
+
+def add_dimension_tables(_database):
+    """the genre, country and person tables, filled from the string columns of the rows
+    already scraped"""
+    create_tables(_database)
+    for _table_name in DETAIL_TABLES:
+        for _batch in get_rowid_batches(_database, _table_name):
+            index_titles(_database, _table_name, "details.rowid >= ? AND details.rowid < ?", _batch)
+        logger.info(f"genres, countries and people of {_table_name} indexed")
+    _database.execute("ANALYZE")
+
+
+def add_search_table(_database):
+    """the full text index of the titles, filled with the rows already scraped"""
+    create_table(_database)
+    for _table_name in DETAIL_TABLES:
+        for _batch in get_rowid_batches(_database, _table_name):
+            index_search(_database, _table_name, "details.rowid >= ? AND details.rowid < ?", _batch)
+        logger.info(f"titles of {_table_name} indexed for search")
+
+
+def add_failed_refreshes(_database):
+    """the number of refreshes of a title that failed in a row, see
+    updater.postpone_failed_refreshes"""
+    for _table_name in DETAIL_TABLES:
+        add_column(_database, _table_name, "failed_refreshes", "INT NOT NULL DEFAULT 0")
+
+
+# the migration at index i brings a database from version i to version i + 1, new ones
+# are only ever appended
+MIGRATIONS = [
+    add_schedule_columns,
+    add_release_year,
+    add_detail_indexes,
+    add_dimension_tables,
+    add_search_table,
+    add_failed_refreshes,
+]
+
+
+def get_version(_database):
+    return _database.execute("PRAGMA user_version", fetch_type="fetch_one")[0]
+
+
+def migrate(_database):
+    """run the migrations a database has not run yet, each one is idempotent so a
+    migration interrupted halfway is simply run again
+
+    Args:
+        _database (Database): the database, its tables created
+
+    Returns:
+        int: the version of the database
+    """
+    _version = get_version(_database)
+    for _index, _migration in enumerate(MIGRATIONS[_version:], start=_version):
+        logger.info(f"migrating the database to version {_index + 1}: {_migration.__name__}")
+        _migration(_database)
+        _database.execute(f"PRAGMA user_version = {_index + 1}")
+    return max(_version, len(MIGRATIONS))
+
+
+if __name__ == "__main__":
+    print("this is a library to migrate the schema of the imdb database")
@@ -0,0 +1,182 @@
+# several scraping processes pulling batches from the same WorkQueue, a process that is
+# done with its batch claims the next one, so no process waits for a slower one.
+# their records are written by a single WriterService
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+
+from imdb_scrapper.lib.async_scrapper import clean_ids, iter_queue_urls, process
+from imdb_scrapper.lib.selector_registry import add_selector_hits
+from imdb_scrapper.lib.session import get_session_manager
+from imdb_scrapper.lib.tconst import IMDB_BASE_PATH
+from imdb_scrapper.lib.work_queue import PENDING, WorkQueue
+from imdb_scrapper.lib.writer import WriterService
+
+# ids claimed at a time, whatever is pending
+MIN_BATCH = 10
+MAX_BATCH = 500
+# a claim takes 1 / (workers * GUIDED_FACTOR) of what is pending, so batches shrink
+# near the end and the workers finish at about the same time
+GUIDED_FACTOR = 4
+# stats of process summed over the workers
+SUMMED_STATS = (
+    "pages",
+    "parse_failures",
+    "parse_seconds",
+    "rows",
+    "write_failures",
+    "handed_over",
+    "write_seconds",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size(_pending, _workers):
+    return max(MIN_BATCH, min(MAX_BATCH, _pending // (_workers * GUIDED_FACTOR)))
+
+
+def _merge_stats(stats, _result):
+    """add the stats of a worker to stats"""
+    for _key in SUMMED_STATS:
+        stats[_key] += _result[_key]
+    for _field, (_calls, _seconds) in _result["fields"].items():
+        _timing = stats["fields"].setdefault(_field, [0, 0.0])
+        _timing[0] += _calls
+        _timing[1] += _seconds
+    add_selector_hits(stats["selectors"], _result["selectors"])
+    stats["latencies"].extend(_result["latencies"])
+
+
+def _run_worker(
+    process_type, workers, parse_workers, use_page_cache, stop_event, results, writer, base_path
+):
+    # the orchestrator decides when to stop, in flight pages are finished first
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work_queue = WorkQueue(process_type)
+    urls = iter_queue_urls(
+        work_queue,
+        clean_ids if process_type == "add" else None,
+        lambda: get_batch_size(work_queue.count(PENDING), workers),
+        stop_event.is_set,
+        base_path,
+    )
+    stats = process(urls, process_type, parse_workers, use_page_cache, work_queue, writer)
+    work_queue.close()
+    results.put(
+        {
+            **{_key: stats[_key] for _key in SUMMED_STATS},
+            "fields": stats["fields"],
+            "selectors": stats["selectors"],
+            "latencies": list(get_session_manager().latencies),
+        }
+    )
+
+
+def orchestrate(
+    process_type="add",
+    workers=None,
+    parse_workers=1,
+    use_page_cache=False,
+    single_writer=True,
+    base_path=IMDB_BASE_PATH,
+):
+    """scrape the WorkQueue of process_type with workers processes until it is empty
+
+    each worker runs its own fetch and parse pipeline and claims batches sized by
+    get_batch_size, its records go to a WriterService. SIGTERM or SIGINT stop the claims, the pages already
+    fetched are written, the ids claimed but not fetched go back to pending.
+
+    Args:
+        process_type (str, optional): [either add, replace or update]. Defaults to 'add'.
+        workers (int, optional): scraping processes. Defaults to the cpu count.
+        parse_workers (int, optional): parse processes of each worker. Defaults to 1.
+        use_page_cache (bool, optional): see process. Defaults to False.
+        single_writer (bool, optional): write from a WriterService, otherwise every
+            worker writes on its own. Defaults to True.
+        base_path (str, optional): the urls of the ids are built under it, a replay
+            server stands in for imdb.com with its own. Defaults to IMDB_BASE_PATH.
+
+    Returns:
+        dict: the stats of process summed over the workers and the fetch latencies of
+            all of them, stopped, True if a signal ended the run before the queue was
+            empty, and writer, the stats of the WriterService
+    """
+    workers = workers or os.cpu_count() or 1
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+
+    def _stop(_signal_number, _frame):
+        logger.warning(f"signal {_signal_number} received, finishing the pages in flight")
+        stop_event.set()
+
+    # bound before anything is started, the finally block reads it whatever fails
+    stats = {
+        **dict.fromkeys(SUMMED_STATS, 0),
+        "fields": {},
+        "selectors": {},
+        "latencies": [],
+    }
+    writer = None
+    _previous_handlers = {
+        _signal: signal.signal(_signal, _stop) for _signal in (signal.SIGTERM, signal.SIGINT)
+    }
+    try:
+        # started first, the workers inherit its queue
+        writer = WriterService().start() if single_writer else None
+        processes = [
+            multiprocessing.Process(
+                target=_run_worker,
+                args=(
+                    process_type,
+                    workers,
+                    parse_workers,
+                    use_page_cache,
+                    stop_event,
+                    results,
+                    writer,
+                    base_path,
+                ),
+            )
+            for _ in range(workers)
+        ]
+        for _process in processes:
+            _process.start()
+        # read before joining, a worker exits only once its result was taken
+        _received = 0
+        while _received < len(processes):
+            if writer and not writer.is_alive() and not stop_event.is_set():
+                # the workers fail on their next record, none claims more ids meanwhile
+                logger.error(f"the writer process ended, exit code {writer.exitcode()}")
+                stop_event.set()
+            try:
+                _result = results.get(timeout=1)
+            except queue.Empty:
+                if not any(_process.is_alive() for _process in processes) and results.empty():
+                    logger.warning(f"{len(processes) - _received} workers ended without result")
+                    break
+                continue
+            _received += 1
+            _merge_stats(stats, _result)
+        for _process in processes:
+            _process.join()
+    finally:
+        # every worker is done handing records over, the writer drains what is left
+        if writer:
+            # the workers only handed their records over, the writer knows what was committed
+            stats["writer"] = writer.stop()
+            stats["rows"] = stats["writer"].get("rows", 0)
+            stats["write_failures"] = stats["writer"].get("failed", 0)
+        for _signal, _handler in _previous_handlers.items():
+            signal.signal(_signal, _handler)
+    stats["stopped"] = stop_event.is_set()
+    _summed = {_key: stats[_key] for _key in SUMMED_STATS}
+    logger.info(f"{workers} workers done: {_summed}, stopped: {stats['stopped']}")
+    return stats
+
+
+if __name__ == "__main__":
+    print("this is a library to run several scraping processes over a work queue")
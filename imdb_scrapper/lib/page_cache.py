@@ -0,0 +1,132 @@
+# raw imdb pages kept on disk, compressed and stored under the sha1 of their content,
+# with an index from imdb_id to the page and the validators imdb sent with it
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+CURRENT_DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+
+ROOT_DIRECTORY = os.path.normpath(CURRENT_DIR_PATH + os.sep + os.pardir)
+
+PAGE_CACHE_DIRECTORY = os.path.join(ROOT_DIRECTORY, "data", "page_cache")
+
+COMPRESSION_LEVEL = 6
+# seconds a process waits for another one writing the index, the workers share it
+INDEX_TIMEOUT = 60
+# raised by a cache whose index is locked or whose files cannot be read or written, the
+# page is then downloaded, or used, without it
+CACHE_ERRORS = (sqlite3.Error, OSError, zlib.error)
+
+
+class PageCache:
+    """content addressed page store, safe to use from the event loop and executor threads"""
+
+    def __init__(self, directory=PAGE_CACHE_DIRECTORY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(directory, "index.db"), timeout=INDEX_TIMEOUT, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS pages (imdb_id TEXT NOT NULL PRIMARY KEY, digest TEXT,
+            fetched_at FLOAT, etag TEXT, last_modified TEXT, size INT)"""
+        )
+        self._connection.commit()
+        self.stats = {"stored": 0, "revalidated": 0}
+
+    def _get_blob_path(self, _digest):
+        return os.path.join(self.directory, _digest[:2], f"{_digest}.zz")
+
+    def _get_row(self, imdb_id):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT digest, etag, last_modified FROM pages WHERE imdb_id = ?",
+                (imdb_id,),
+            ).fetchone()
+
+    def get_validators(self, imdb_id):
+        """headers making the request conditional on the cached copy of imdb_id"""
+        _row = self._get_row(imdb_id)
+        # without the page itself a 304 answer would be useless
+        if not _row or not os.path.exists(self._get_blob_path(_row[0])):
+            return {}
+        _headers = {}
+        if _row[1]:
+            _headers["If-None-Match"] = _row[1]
+        if _row[2]:
+            _headers["If-Modified-Since"] = _row[2]
+        return _headers
+
+    def get(self, imdb_id):
+        """the cached page of imdb_id, None if there is none"""
+        _row = self._get_row(imdb_id)
+        if not _row:
+            return None
+        try:
+            with open(self._get_blob_path(_row[0]), "rb") as file:
+                return zlib.decompress(file.read())
+        except (IOError, zlib.error):
+            return None
+
+    def put(self, imdb_id, _html, _etag=None, _last_modified=None):
+        _digest = hashlib.sha1(_html).hexdigest()
+        _blob_path = self._get_blob_path(_digest)
+        if not os.path.exists(_blob_path):
+            os.makedirs(os.path.dirname(_blob_path), exist_ok=True)
+            # written aside then renamed so a crash never leaves a truncated page
+            _tmp_path = f"{_blob_path}.{threading.get_ident()}.tmp"
+            with open(_tmp_path, "wb") as file:
+                file.write(zlib.compress(_html, COMPRESSION_LEVEL))
+            os.replace(_tmp_path, _blob_path)
+        with self._lock:
+            _previous = self._connection.execute(
+                "SELECT digest FROM pages WHERE imdb_id = ?", (imdb_id,)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (imdb_id, _digest, time.time(), _etag, _last_modified, len(_html)),
+            )
+            self._connection.commit()
+            _orphan = (
+                _previous
+                and _previous[0] != _digest
+                and not self._connection.execute(
+                    "SELECT 1 FROM pages WHERE digest = ? LIMIT 1", (_previous[0],)
+                ).fetchone()
+            )
+        if _orphan:
+            os.remove(self._get_blob_path(_previous[0]))
+        self.stats["stored"] += 1
+
+    def touch(self, imdb_id):
+        """record that imdb answered 304 not modified for imdb_id"""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET fetched_at = ? WHERE imdb_id = ?",
+                (time.time(), imdb_id),
+            )
+            self._connection.commit()
+        self.stats["revalidated"] += 1
+
+    def iter_fetched(self):
+        """(imdb_id, fetched_at) of every cached page, fetched_at is the last time imdb
+        sent it or said it had not changed"""
+        with self._lock:
+            _rows = self._connection.execute(
+                "SELECT imdb_id, fetched_at FROM pages ORDER BY imdb_id"
+            ).fetchall()
+        return iter(_rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+if __name__ == "__main__":
+    print("this is a library to keep raw imdb pages on disk")
@@ -0,0 +1,162 @@
+# read the json blocks embedded in an imdb title page straight from the raw bytes,
+# without building a BeautifulSoup tree of the whole document
+import json
+
+from bs4 import BeautifulSoup
+
+LD_JSON_MARKER = b'type="application/ld+json"'
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+SCRIPT_END = b"</script>"
+
+
+def get_script_json(_html, _marker):
+    """find the <script> tag holding _marker and load its content as json
+
+    Args:
+        _html (bytes): the raw page
+        _marker (bytes): an attribute of the wanted script tag
+
+    Returns:
+        dict: the loaded json, None if the tag is missing or its content is not json
+    """
+    _marker_index = _html.find(_marker)
+    if _marker_index == -1:
+        return None
+    _start = _html.find(b">", _marker_index) + 1
+    _end = _html.find(SCRIPT_END, _start)
+    if not _start or _end == -1:
+        return None
+    try:
+        return json.loads(_html[_start:_end])
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def get_ld_json(_html):
+    return get_script_json(_html, LD_JSON_MARKER)
+
+
+def get_next_data(_html):
+    _next_data = get_script_json(_html, NEXT_DATA_MARKER)
+    try:
+        return _next_data["props"]["pageProps"]
+    except (KeyError, TypeError):
+        return None
+
+
+class LazySoup:
+    """stands in for a BeautifulSoup tree and only parses the page the first time
+    it is used, pages whose fields all come from the embedded json are never parsed"""
+
+    def __init__(self, _html):
+        self._html = _html
+        self._soup = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self._html, "lxml")
+            self._html = None
+        return self._soup
+
+    def __getattr__(self, _name):
+        return getattr(self.soup, _name)
+
+    def __str__(self):
+        return str(self.soup)
+
+
+def _get(_data, *_keys):
+    for _key in _keys:
+        try:
+            _data = _data[_key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return _data
+
+
+def _above_the_fold(_next_data):
+    return _get(_next_data, "aboveTheFoldData")
+
+
+def _main_column(_next_data):
+    return _get(_next_data, "mainColumnData")
+
+
+def get_title(_next_data):
+    return _get(_above_the_fold(_next_data), "titleText", "text")
+
+
+def get_original_title(_next_data):
+    return _get(_above_the_fold(_next_data), "originalTitleText", "text")
+
+
+def get_countries(_next_data):
+    for _section in (_main_column(_next_data), _above_the_fold(_next_data)):
+        _countries = _get(_section, "countriesOfOrigin", "countries")
+        if _countries:
+            return [country["text"] for country in _countries]
+    return None
+
+
+def get_genres(_next_data):
+    _genres = _get(_above_the_fold(_next_data), "genres", "genres")
+    if not _genres:
+        return None
+    return [genre["text"] for genre in _genres]
+
+
+def get_voters(_next_data):
+    return _get(_above_the_fold(_next_data), "ratingsSummary", "voteCount")
+
+
+def get_rated(_next_data):
+    return _get(_above_the_fold(_next_data), "certificate", "rating")
+
+
+def get_release_date(_next_data):
+    _date = _get(_above_the_fold(_next_data), "releaseDate")
+    if not _date or not _date.get("year"):
+        return None
+    _parts = [_date.get("year"), _date.get("month"), _date.get("day")]
+    return "-".join(f"{part:02d}" for part in _parts if part)
+
+
+def get_runtime(_next_data):
+    return _get(
+        _above_the_fold(_next_data), "runtime", "displayableProperty", "value", "plainText"
+    )
+
+
+def get_series_years(_next_data):
+    _release_year = _get(_above_the_fold(_next_data), "releaseYear")
+    if not _release_year or not _release_year.get("year"):
+        return None
+    return f"{_release_year['year']}–{_release_year.get('endYear') or ''}"
+
+
+def get_seasons(_next_data):
+    _seasons = _get(_main_column(_next_data), "episodes", "seasons")
+    if not _seasons:
+        return None
+    return len(_seasons)
+
+
+def get_credits(_next_data, _category_id):
+    """names listed under one of the principal credits of the page
+
+    Args:
+        _next_data (dict): page props of __NEXT_DATA__
+        _category_id (str): [either director, creator or cast]
+    """
+    for _credit in _get(_above_the_fold(_next_data), "principalCredits") or []:
+        if _get(_credit, "category", "id") == _category_id:
+            _names = [_get(item, "name", "nameText", "text") for item in _credit["credits"]]
+            _names = [name for name in _names if name]
+            if _names:
+                return _names
+    return None
+
+
+if __name__ == "__main__":
+    print("this is a library to read the json embedded in imdb pages")
@@ -0,0 +1,94 @@
+# title.ratings.tsv(.gz) read as a stream, decompressed as it arrives, so the whole
+# dataset never sits in memory or on disk twice
+import contextlib
+import gzip
+import logging
+import urllib.error
+import urllib.request
+
+RATINGS_URL = "https://datasets.imdbws.com/title.ratings.tsv.gz"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# bytes copied at a time when the stream is saved to disk
+COPY_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def is_url(_source):
+    return _source.startswith(("http://", "https://"))
+
+
+@contextlib.contextmanager
+def open_ratings_source(_source=RATINGS_URL):
+    """a binary stream of the uncompressed tsv
+
+    Args:
+        _source (str, optional): an url or a local path, to a .tsv or a .tsv.gz.
+            Defaults to RATINGS_URL.
+
+    Yields:
+        file object: read it line by line, the download or the file is only read
+            as far as it is consumed
+    """
+    if is_url(_source):
+        with urllib.request.urlopen(_source) as response:
+            if _source.endswith(".gz"):
+                with gzip.GzipFile(fileobj=response) as file:
+                    yield file
+            else:
+                yield response
+    else:
+        with open(_source, "rb") as file:
+            _compressed = file.read(2) == GZIP_MAGIC
+            file.seek(0)
+            if _compressed:
+                with gzip.GzipFile(fileobj=file) as unzipped_file:
+                    yield unzipped_file
+            else:
+                yield file
+
+
+def iter_ratings(_source=RATINGS_URL):
+    """yield (tconst, rating, votes) for every title of the dataset, one line at a time
+
+    Args:
+        _source (str, optional): see open_ratings_source. Defaults to RATINGS_URL.
+
+    Yields:
+        tuple: (str, float, int)
+    """
+    with open_ratings_source(_source) as file:
+        # ignore the header line
+        file.readline()
+        for _line in file:
+            _fields = _line.rstrip(b"\r\n").split(b"\t")
+            if len(_fields) != 3:
+                continue
+            _tconst, _rating, _votes = _fields
+            try:
+                yield _tconst.decode("ascii"), float(_rating), int(_votes)
+            except ValueError:
+                logger.warning(f"ignored malformed ratings line {_line!r}")
+
+
+def save_ratings(_source, _output_path):
+    """decompress _source into _output_path chunk by chunk
+
+    Returns:
+        str: _output_path, None if the source could not be read
+    """
+    try:
+        with open_ratings_source(_source) as file:
+            with open(_output_path, "wb") as file_out:
+                while _chunk := file.read(COPY_CHUNK_SIZE):
+                    file_out.write(_chunk)
+        return _output_path
+    except (urllib.error.URLError, IOError) as error:
+        logger.warning(f"{_source} could not be saved: {error}")
+        return None
+
+
+if __name__ == "__main__":
+    print("this is a library to stream the imdb ratings dataset")
@@ -0,0 +1,113 @@
+# a local stand-in for imdb.com serving recorded pages, with made up latency and errors,
+# so the scraper can be measured without any network
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import random
+import zlib
+
+from aiohttp import web
+
+from imdb_scrapper.lib.page_cache import PAGE_CACHE_DIRECTORY
+from imdb_scrapper.lib.tconst import to_url
+
+REPLAY_HOST = "127.0.0.1"
+REPLAY_PORT = 8089
+# the replayed ids start there, away from the ids of real titles
+REPLAY_FIRST_ID = 9000000
+
+logger = logging.getLogger(__name__)
+
+
+def load_corpus(_corpus_path=None):
+    """recorded pages to serve
+
+    Args:
+        _corpus_path (str, optional): a directory of .html pages, or of a PageCache.
+            Defaults to the PageCache directory.
+
+    Returns:
+        list: the raw pages
+    """
+    _corpus_path = _corpus_path or PAGE_CACHE_DIRECTORY
+    _pages = []
+    for _path in sorted(glob.glob(os.path.join(_corpus_path, "*.html"))):
+        with open(_path, "rb") as file:
+            _pages.append(file.read())
+    for _path in sorted(glob.glob(os.path.join(_corpus_path, "*", "*.zz"))):
+        with open(_path, "rb") as file:
+            _pages.append(zlib.decompress(file.read()))
+    return _pages
+
+
+def build_replay_app(_pages, _latency=0.05, _jitter=0.02, _error_rate=0.0):
+    """any /title/{imdb_id} is answered with one of the recorded pages, always the same
+    for a given imdb_id, after _latency +- _jitter seconds. _error_rate of the requests
+    get a 503 instead."""
+
+    async def title(request):
+        await asyncio.sleep(max(0, random.uniform(_latency - _jitter, _latency + _jitter)))
+        if random.random() < _error_rate:
+            return web.Response(status=503)
+        imdb_id = request.match_info["imdb_id"]
+        _page = _pages[int(imdb_id[2:]) % len(_pages)]
+        return web.Response(body=_page, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/title/{imdb_id}", title)
+    return app
+
+
+def _run_replay_server(_corpus_path, _port, _latency, _jitter, _error_rate, _ready):
+    _pages = load_corpus(_corpus_path)
+    app = build_replay_app(_pages, _latency, _jitter, _error_rate)
+
+    async def _on_startup(_app):
+        _ready.set()
+
+    app.on_startup.append(_on_startup)
+    web.run_app(app, host=REPLAY_HOST, port=_port, print=None, access_log=None)
+
+
+def start_replay_server(
+    _corpus_path=None, _port=REPLAY_PORT, _latency=0.05, _jitter=0.02, _error_rate=0.0
+):
+    """serve the corpus from its own process so it does not share the scraper's cpu
+
+    Returns:
+        multiprocessing.Process: the server, terminate it when done
+    """
+    if not load_corpus(_corpus_path):
+        raise FileNotFoundError(f"no recorded page found in {_corpus_path}")
+    _ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=_run_replay_server,
+        args=(_corpus_path, _port, _latency, _jitter, _error_rate, _ready),
+        daemon=True,
+    )
+    server.start()
+    _ready.wait(30)
+    logger.info(f"replay server listening on http://{REPLAY_HOST}:{_port}")
+    return server
+
+
+def get_replay_base_path(_port=REPLAY_PORT):
+    """the base path under which the replay server answers as imdb.com would"""
+    return f"http://{REPLAY_HOST}:{_port}/title/"
+
+
+def get_replay_ids(_count, _first_id=REPLAY_FIRST_ID):
+    return range(_first_id, _first_id + _count)
+
+
+def get_replay_urls(_count, _port=REPLAY_PORT, _first_id=REPLAY_FIRST_ID):
+    return (
+        to_url(imdb_id, get_replay_base_path(_port))
+        for imdb_id in get_replay_ids(_count, _first_id)
+    )
+
+
+if __name__ == "__main__":
+    print("this is a library to replay recorded imdb pages locally")
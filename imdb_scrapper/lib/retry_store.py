@@ -0,0 +1,114 @@
+# urls that could not be fetched or parsed are kept on disk with their number of
+# attempts, the next run hands them out again before any new url
+import logging
+import os
+import random
+import sqlite3
+import time
+
+CURRENT_DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+
+ROOT_DIRECTORY = os.path.normpath(CURRENT_DIR_PATH + os.sep + os.pardir)
+
+RETRY_DATABASE_LOCATION = os.path.join(ROOT_DIRECTORY, "database", "retry_queue.db")
+
+# a url failing this many runs in a row is kept as dead and not handed out again
+MAX_ATTEMPTS = 5
+# seconds before a failed url is due again, doubled with every attempt
+RETRY_BACKOFF_BASE = 60
+RETRY_BACKOFF_CAP = 24 * 60 * 60
+# seconds a claimed url is kept from the other processes, it is due again after that
+# if the process claiming it died before recording the outcome
+RETRY_LEASE_SECONDS = 600
+
+os.makedirs(os.path.dirname(RETRY_DATABASE_LOCATION), exist_ok=True)
+
+logger = logging.getLogger(__name__)
+
+
+def get_backoff(_attempt, _base, _cap):
+    """full jitter exponential backoff, a random delay up to _base * 2 ** _attempt seconds"""
+    return random.uniform(0, min(_cap, _base * 2**_attempt))
+
+
+class RetryStore:
+    """failed urls of one process_type, stored in their own sqlite file so recording a
+    failure never waits on the lock of the main database"""
+
+    def __init__(self, process_type="add", database_location=None):
+        self.process_type = process_type
+        # the scraping processes share the file, a claim waits for the one in progress
+        self._connection = sqlite3.connect(
+            database_location or RETRY_DATABASE_LOCATION, timeout=60
+        )
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS failed_urls (url TEXT NOT NULL, process_type TEXT NOT NULL,
+            attempts INT, last_error TEXT, next_attempt_at FLOAT, PRIMARY KEY (url, process_type))"""
+        )
+        self._connection.commit()
+        # urls handed out by this store, only those can be resolved
+        self._pending = set()
+
+    def claim_due_urls(self, lease_seconds=RETRY_LEASE_SECONDS):
+        """failed urls whose backoff is over, oldest due first. they are leased to this
+        store in the same transaction, so processes sharing the file never claim the
+        same url"""
+        _now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            _rows = self._connection.execute(
+                """SELECT url FROM failed_urls WHERE process_type = ? AND attempts < ?
+                AND next_attempt_at <= ? ORDER BY next_attempt_at""",
+                (self.process_type, MAX_ATTEMPTS, _now),
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE failed_urls SET next_attempt_at = ? WHERE url = ? AND process_type = ?",
+                [(_now + lease_seconds, _row[0], self.process_type) for _row in _rows],
+            )
+        except sqlite3.Error:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+        _urls = [_row[0] for _row in _rows]
+        self._pending.update(_urls)
+        if _urls:
+            logger.info(f"{len(_urls)} failed urls will be retried first")
+        return _urls
+
+    def add_failure(self, url, error):
+        _row = self._connection.execute(
+            "SELECT attempts FROM failed_urls WHERE url = ? AND process_type = ?",
+            (url, self.process_type),
+        ).fetchone()
+        _attempts = (_row[0] if _row else 0) + 1
+        _next_attempt_at = time.time() + get_backoff(
+            _attempts, RETRY_BACKOFF_BASE, RETRY_BACKOFF_CAP
+        )
+        self._connection.execute(
+            "INSERT OR REPLACE INTO failed_urls VALUES (?, ?, ?, ?, ?)",
+            (url, self.process_type, _attempts, str(error), _next_attempt_at),
+        )
+        self._connection.commit()
+        self._pending.discard(url)
+        if _attempts >= MAX_ATTEMPTS:
+            logger.warning(f"{url} failed {_attempts} times, it will not be retried")
+        else:
+            logger.warning(f"{url} failed ({error}), stored for a later retry")
+
+    def resolve(self, url):
+        """forget a url that was retried successfully"""
+        if url not in self._pending:
+            return
+        self._pending.discard(url)
+        self._connection.execute(
+            "DELETE FROM failed_urls WHERE url = ? AND process_type = ?",
+            (url, self.process_type),
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+if __name__ == "__main__":
+    print("this is a library to keep failed urls for a later run")
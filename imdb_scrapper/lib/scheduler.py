@@ -0,0 +1,108 @@
+# when a scraped title is due to be scraped again: soon for titles just released or
+# gaining votes fast, rarely for old quiet ones. the due time is kept per row in
+# next_due_at so the next batch is read from an index instead of scanning every row
+import datetime
+import math
+import re
+
+DAY = 86400
+# (release age in days, refresh interval in days), the first matching age wins
+REFRESH_DAYS_BY_AGE = ((30, 1), (365, 7), (5 * 365, 30))
+OLD_REFRESH_DAYS = 180
+MIN_REFRESH_DAYS = 1
+MAX_REFRESH_DAYS = 365
+# titles scraped again per run at most
+REFRESH_BUDGET = 10000
+# days before a title whose refresh wrote nothing is tried again, doubled with every
+# failure in a row
+FAILED_REFRESH_DAYS = 1
+# columns added to movie_details and serie_details
+SCHEDULE_COLUMNS = {"last_scraped_at": "FLOAT", "next_due_at": "FLOAT"}
+
+RELEASE_DATE_PATTERN = re.compile(r"^(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?")
+
+
+def get_release_day(_release_date):
+    """the date of a release_date like 2021-03-04, 2021-03 or 2021, None when it is not one"""
+    if not isinstance(_release_date, str):
+        return None
+    _match = RELEASE_DATE_PATTERN.match(_release_date)
+    if not _match:
+        return None
+    _year, _month, _day = _match.groups()
+    try:
+        return datetime.date(int(_year), int(_month or 1), int(_day or 1))
+    except ValueError:
+        return None
+
+
+def get_release_year(_release_date):
+    """the year of a release_date like 2021-03-04, 2021-03 or 2021, None when it has none"""
+    if not isinstance(_release_date, str):
+        return None
+    _match = RELEASE_DATE_PATTERN.match(_release_date)
+    return int(_match.group(1)) if _match else None
+
+
+def get_refresh_days(_release_date, _votes_per_day=0, _today=None):
+    """days until a title is scraped again, shorter the newer and the faster voted it is"""
+    _release_day = get_release_day(_release_date)
+    _refresh_days = OLD_REFRESH_DAYS
+    if _release_day:
+        _age_days = ((_today or datetime.date.today()) - _release_day).days
+        for _max_age_days, _days in REFRESH_DAYS_BY_AGE:
+            if _age_days <= _max_age_days:
+                _refresh_days = _days
+                break
+    # every tenfold of votes per day divides the interval once more
+    _refresh_days /= 1 + math.log10(1 + max(_votes_per_day, 0))
+    return min(max(_refresh_days, MIN_REFRESH_DAYS), MAX_REFRESH_DAYS)
+
+
+def get_next_due_at(_release_date, _previous_voters, _voters, _last_scraped_at, _now):
+    """timestamp at which a title scraped at _now is due again
+
+    Args:
+        _release_date (str): release_date of the row
+        _previous_voters (int): voters at the previous scrape, None if there was none
+        _voters (int): voters read by this scrape
+        _last_scraped_at (float): timestamp of the previous scrape, None if there was none
+        _now (float): timestamp of this scrape
+
+    Returns:
+        float: timestamp
+    """
+    _votes_per_day = 0
+    if (
+        _last_scraped_at
+        and isinstance(_previous_voters, int)
+        and isinstance(_voters, int)
+    ):
+        _days = max((_now - _last_scraped_at) / DAY, 1)
+        _votes_per_day = (_voters - _previous_voters) / _days
+    _today = datetime.date.fromtimestamp(_now)
+    return _now + get_refresh_days(_release_date, _votes_per_day, _today) * DAY
+
+
+def get_failed_due_at(_failed_refreshes, _now):
+    """timestamp at which a title whose refresh failed at _now is tried again
+
+    Args:
+        _failed_refreshes (int): refreshes of the title that failed in a row before this one
+        _now (float): timestamp of the failure
+    """
+    _days = FAILED_REFRESH_DAYS * 2 ** min(_failed_refreshes or 0, 16)
+    return _now + min(_days, MAX_REFRESH_DAYS) * DAY
+
+
+def register_functions(_connection):
+    """next_due_at(release_date, previous voters, voters, last_scraped_at, now),
+    failed_due_at(failed_refreshes, now) and release_year(release_date) in sql, an
+    UPDATE reads the previous values of the row in them before they are replaced"""
+    _connection.create_function("next_due_at", 5, get_next_due_at, deterministic=True)
+    _connection.create_function("failed_due_at", 2, get_failed_due_at, deterministic=True)
+    _connection.create_function("release_year", 1, get_release_year, deterministic=True)
+
+
+if __name__ == "__main__":
+    print("this is a library to schedule when a title is scraped again")
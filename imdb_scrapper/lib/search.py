@@ -0,0 +1,96 @@
+# full text index of the titles, an fts5 table tokenized in trigrams so any part of a
+# title is found from the index instead of a LIKE '%...%' scan of the detail tables
+import unicodedata
+
+from imdb_scrapper.lib.tconst import TCONST_PREFIX, encode
+
+SEARCH_TABLE = "title_search"
+# trigrams are case insensitive, folded holds the titles without accents as well
+SEARCH_TOKENIZER = "trigram"
+# a trigram index only finds the texts of at least that many characters
+MIN_SEARCH_LENGTH = 3
+
+
+def fold(_text):
+    """the text lowercased and without its accents, é and E are both e"""
+    if not isinstance(_text, str):
+        return None
+    _decomposed = unicodedata.normalize("NFKD", _text.casefold())
+    return "".join(_char for _char in _decomposed if not unicodedata.combining(_char))
+
+
+def get_folded(_title, _original_title):
+    return " ".join(filter(None, (fold(_title), fold(_original_title)))) or None
+
+
+def register_functions(_connection):
+    """fold_titles(title, original_title) in sql, the folded column of the index"""
+    _connection.create_function("fold_titles", 2, get_folded, deterministic=True)
+
+
+def create_table(_database):
+    _database.execute(
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(imdb_id UNINDEXED,
+        title, original_title, folded, tokenize='{SEARCH_TOKENIZER}')"""
+    )
+
+
+def get_search_commands(details):
+    """(statement, parameters) indexing the titles of a record, its rowid is its id as
+    an int so indexing it again replaces the previous entry"""
+    return [
+        (
+            f"""INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, imdb_id, title, original_title, folded)
+            VALUES (?, ?, ?, ?, ?)""",
+            (
+                encode(details.imdb_id),
+                details.imdb_id,
+                details.title,
+                details.original_title,
+                get_folded(details.title, details.original_title),
+            ),
+        )
+    ]
+
+
+def index_search(_connection, _table_name, _condition="true", _params=()):
+    """index the titles of the rows of _table_name matching _condition
+
+    Args:
+        _connection (Database or sqlite3.Connection): fold_titles registered on it
+        _table_name (str): a detail table, aliased details in _condition
+        _condition (str, optional): sql condition on details. Defaults to every title.
+        _params (tuple, optional): parameters of _condition. Defaults to ().
+    """
+    # the rowid is the id as an int, see tconst.encode
+    _connection.execute(
+        f"""INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, imdb_id, title, original_title, folded)
+        SELECT CAST(substr(imdb_id, {len(TCONST_PREFIX) + 1}) AS INT), imdb_id, title, original_title,
+        fold_titles(title, original_title) FROM {_table_name} AS details WHERE {_condition}""",
+        _params,
+    )
+
+
+def get_phrase(_text):
+    """_text as an fts5 string, matched as it is whatever characters it holds"""
+    return '"' + _text.replace('"', '""') + '"'
+
+
+def get_match_query(_text, fold_accents=False):
+    """the fts5 query finding _text anywhere in a title or an original title, None when it
+    is too short for the trigram index
+
+    Args:
+        _text (str): part of a title, as typed
+        fold_accents (bool, optional): also find the titles written with other accents.
+            Defaults to False.
+    """
+    if len(_text) < MIN_SEARCH_LENGTH:
+        return None
+    if fold_accents:
+        return f"folded : {get_phrase(fold(_text))}"
+    return f"{{title original_title}} : {get_phrase(_text)}"
+
+
+if __name__ == "__main__":
+    print("this is a library to search the titles")
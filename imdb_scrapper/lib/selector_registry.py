@@ -0,0 +1,134 @@
+# every css selector the extractors fall back to, compiled once per process and
+# tried in order, with a count of which one matched so dead ones can be found
+import soupsieve
+
+from imdb_scrapper.lib.page_data import LazySoup
+
+# name -> selectors tried in order, the first one matching wins
+SELECTORS = {
+    "title": [".TitleHeader__TitleText-sc-1wu6n3d-0"],
+    "director": [
+        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0 > ul:nth-child(1) > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
+        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-hdn81t-0 > ul:nth-child(1) > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
+    ],
+    "seasons_label": ["#browse-episodes-season"],
+    "seasons_link": [
+        ".BrowseEpisodes__BrowseLinksContainer-sc-1a626ql-4 > a:nth-child(2) > div:nth-child(1)"
+    ],
+    "series_runtime": [
+        ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(4)",
+        ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(3)",
+    ],
+    "credits_creator": [
+        ".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0 > ul:nth-child(1)"
+    ],
+    "credits_star": [".PrincipalCredits__PrincipalCreditsPanelWideScreen-sc-hdn81t-0"],
+    "series_years": [".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(2)"],
+    "genres": [
+        "ul.ipc-metadata-list:nth-child(4) > li:nth-child(1) > div:nth-child(2)",
+        "ul.ipc-metadata-list:nth-child(4) > li:nth-child(2) > div:nth-child(2)",
+        ".Storyline__StorylineMetaDataList-sc-1b58ttw-1 > li:nth-child(1) > div:nth-child(2) > ul:nth-child(1)",
+    ],
+    "genres_chips": ["div.ipc-chip-list:nth-child(1)"],
+    "voters": ["ul.ipc-metadata-list:nth-child(4) > li:nth-child(2) > div:nth-child(2)"],
+    "release_date": [
+        ".TitleBlockMetaData__MetaDataList-sc-12ein40-0 > li:nth-child(1) > a:nth-child(1)"
+    ],
+    "rated": [
+        "ul.ipc-inline-list--show-dividers:nth-child(2) > li:nth-child(3) > a:nth-child(1)"
+    ],
+}
+
+COMPILED_SELECTORS = {
+    _name: [soupsieve.compile(_selector) for _selector in _selectors]
+    for _name, _selectors in SELECTORS.items()
+}
+
+# name -> hits of each selector followed by the number of misses, for this process
+SELECTOR_HITS = {}
+
+
+def _record(_name, _index):
+    _hits = SELECTOR_HITS.setdefault(_name, [0] * (len(SELECTORS[_name]) + 1))
+    _hits[_index] += 1
+
+
+def _get_tree(_soup):
+    return _soup.soup if isinstance(_soup, LazySoup) else _soup
+
+
+def select_one(_soup, _name):
+    """the element matched by the first selector of _name that matches, None if none does"""
+    _tree = _get_tree(_soup)
+    for _index, _selector in enumerate(COMPILED_SELECTORS[_name]):
+        _element = _selector.select_one(_tree)
+        if _element is not None:
+            _record(_name, _index)
+            return _element
+    _record(_name, -1)
+    return None
+
+
+def select(_soup, _name):
+    """the elements matched by the first selector of _name matching any, [] if none does"""
+    _tree = _get_tree(_soup)
+    for _index, _selector in enumerate(COMPILED_SELECTORS[_name]):
+        _elements = _selector.select(_tree)
+        if _elements:
+            _record(_name, _index)
+            return _elements
+    _record(_name, -1)
+    return []
+
+
+def select_first(_soup, _name, _extract):
+    """_extract of the first element matched by a selector of _name for which it is not
+    empty, the next selectors are tried when an element matches but holds nothing usable
+
+    Args:
+        _soup (BeautifulSoup or LazySoup): the page
+        _name (str): a key of SELECTORS
+        _extract (function): element -> value, an empty value moves on to the next selector
+
+    Returns:
+        the first value that is not empty, None if no selector gives one
+    """
+    _tree = _get_tree(_soup)
+    for _index, _selector in enumerate(COMPILED_SELECTORS[_name]):
+        _element = _selector.select_one(_tree)
+        if _element is None:
+            continue
+        _value = _extract(_element)
+        if _value:
+            _record(_name, _index)
+            return _value
+    _record(_name, -1)
+    return None
+
+
+def pop_selector_hits():
+    _selector_hits = {_name: list(_hits) for _name, _hits in SELECTOR_HITS.items()}
+    SELECTOR_HITS.clear()
+    return _selector_hits
+
+
+def add_selector_hits(_total, _selector_hits):
+    for _name, _hits in _selector_hits.items():
+        _total_hits = _total.setdefault(_name, [0] * len(_hits))
+        for _index, _count in enumerate(_hits):
+            _total_hits[_index] += _count
+    return _total
+
+
+def get_selector_report(_selector_hits):
+    """(name, selector, hits) for every selector, selector is None for the misses of name"""
+    _report = []
+    for _name, _selectors in SELECTORS.items():
+        _hits = _selector_hits.get(_name, [0] * (len(_selectors) + 1))
+        for _selector, _count in zip(_selectors + [None], _hits):
+            _report.append((_name, _selector, _count))
+    return _report
+
+
+if __name__ == "__main__":
+    print("this is a library of the css selectors used by the extractors")
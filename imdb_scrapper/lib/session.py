@@ -0,0 +1,126 @@
+# one pooled aiohttp session per process, so keep-alive connections, tls sessions
+# and the dns cache survive from one chunk of urls to the next
+import asyncio
+import collections
+import logging
+import os
+
+import aiohttp
+
+# 0 means no limit on the total number of connections
+POOL_LIMIT = 0
+POOL_LIMIT_PER_HOST = 200
+# seconds an idle connection is kept open for reuse
+KEEPALIVE_TIMEOUT = 30
+# seconds a resolved host is cached
+DNS_CACHE_TTL = 300
+# number of most recent request latencies kept for the stats
+LATENCY_SAMPLES = 10000
+
+HEADERS = {
+    "user-agent": "Mozilla/5.0 (Linux; Android 7.0; SM-G892A Build/NRD90M; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/60.0.3112.107 Mobile Safari/537.36"
+}
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """owns the connector and session of the process and counts how the pool is used"""
+
+    def __init__(
+        self,
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self._session = None
+        self._loop = None
+        self.stats = {
+            "requests": 0,
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+        # seconds between sending a request and receiving its headers
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def _trace_config(self):
+        def count(_stat):
+            async def _on_event(_session, _context, _params):
+                self.stats[_stat] += 1
+
+            return _on_event
+
+        async def _on_request_start(_session, _context, _params):
+            self.stats["requests"] += 1
+            _context.start = asyncio.get_running_loop().time()
+
+        async def _on_request_end(_session, _context, _params):
+            self.latencies.append(asyncio.get_running_loop().time() - _context.start)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_request_end.append(_on_request_end)
+        trace_config.on_connection_create_end.append(count("connections_opened"))
+        trace_config.on_connection_reuseconn.append(count("connections_reused"))
+        trace_config.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace_config
+
+    def get_session(self):
+        """the session of the running event loop, created on first use
+
+        a session can not outlive the loop it was created on, a new loop gets a new session
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=HEADERS,
+                trust_env=True,
+                trace_configs=[self._trace_config()],
+            )
+            self._loop = loop
+        return self._session
+
+    def get_stats(self):
+        _stats = dict(self.stats)
+        _connections = _stats["connections_opened"] + _stats["connections_reused"]
+        _stats["reuse_ratio"] = (
+            _stats["connections_reused"] / _connections if _connections else 0
+        )
+        return _stats
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+        logger.info(f"connection pool stats: {self.get_stats()}")
+
+
+_session_managers = {}
+
+
+def get_session_manager(**kwargs):
+    """the SessionManager of the current process, kwargs are only used when it is created"""
+    _pid = os.getpid()
+    if _pid not in _session_managers:
+        _session_managers[_pid] = SessionManager(**kwargs)
+    return _session_managers[_pid]
+
+
+if __name__ == "__main__":
+    print("this is a library to share one aiohttp session per process")
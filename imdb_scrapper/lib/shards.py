@@ -0,0 +1,259 @@
+# several hosts scraping the same catalogue: the imdb ids are split in hash buckets
+# (shards) that a host claims under a lease in a coordination database every host
+# can reach, a shared sqlite file. the lease is renewed by a heartbeat while the
+# host works, a host that stops renewing loses its shard to the next one claiming
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from imdb_scrapper.lib import async_scrapper, dimensions, search
+from imdb_scrapper.lib.database import get_database
+from imdb_scrapper.lib.imdb_id import IMDB_DATA_PATH, iter_imdb_ids
+from imdb_scrapper.lib.migrations import DETAIL_TABLES
+from imdb_scrapper.lib.orchestrator import orchestrate
+from imdb_scrapper.lib.work_queue import WorkQueue
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+SHARD_COUNT = 64
+# seconds a shard stays leased without a heartbeat
+SHARD_LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def get_node_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_shard(imdb_id, shard_count=SHARD_COUNT):
+    """the bucket of an int imdb id, consecutive ids land in different shards"""
+    return imdb_id % shard_count
+
+
+class ShardCoordinator:
+    """the shards of one process_type in the coordination database"""
+
+    def __init__(
+        self, coordination_location, process_type="add", node=None, shard_count=SHARD_COUNT
+    ):
+        self.process_type = process_type
+        self.node = node or get_node_name()
+        self.shard_count = shard_count
+        self._connection = sqlite3.connect(
+            coordination_location, timeout=60, isolation_level=None
+        )
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS shards (process_type TEXT NOT NULL, shard INT NOT NULL,
+            shard_count INT NOT NULL, state TEXT NOT NULL, node TEXT, lease_until FLOAT,
+            heartbeat_at FLOAT, PRIMARY KEY (process_type, shard_count, shard))"""
+        )
+        self._connection.executemany(
+            f"INSERT OR IGNORE INTO shards (process_type, shard, shard_count, state) VALUES (?, ?, ?, '{PENDING}')",
+            [(process_type, _shard, shard_count) for _shard in range(shard_count)],
+        )
+
+    def claim(self, lease_seconds=SHARD_LEASE_SECONDS):
+        """lease a pending shard, or one whose lease expired, to this node
+
+        Returns:
+            int: the shard, None once every shard is done or leased
+        """
+        _now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            _row = self._connection.execute(
+                f"""SELECT shard, node FROM shards WHERE process_type = ? AND shard_count = ? AND
+                (state = '{PENDING}' OR (state = '{LEASED}' AND lease_until < ?)) ORDER BY shard LIMIT 1""",
+                (self.process_type, self.shard_count, _now),
+            ).fetchone()
+            if _row:
+                self._connection.execute(
+                    f"""UPDATE shards SET state = '{LEASED}', node = ?, lease_until = ?, heartbeat_at = ?
+                    WHERE process_type = ? AND shard_count = ? AND shard = ?""",
+                    (self.node, _now + lease_seconds, _now, self.process_type, self.shard_count, _row[0]),
+                )
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        if not _row:
+            return None
+        if _row[1]:
+            logger.warning(f"shard {_row[0]} taken over from {_row[1]}, its lease expired")
+        return _row[0]
+
+    def _set_shard(self, _shard, _assignments, _values=()):
+        _cursor = self._connection.execute(
+            f"""UPDATE shards SET {_assignments}
+            WHERE process_type = ? AND shard_count = ? AND shard = ? AND node = ? AND state = '{LEASED}'""",
+            (*_values, self.process_type, self.shard_count, _shard, self.node),
+        )
+        return _cursor.rowcount == 1
+
+    def heartbeat(self, shard, lease_seconds=SHARD_LEASE_SECONDS):
+        """renew the lease of shard, False if this node lost it"""
+        _now = time.time()
+        return self._set_shard(
+            shard, "lease_until = ?, heartbeat_at = ?", (_now + lease_seconds, _now)
+        )
+
+    def complete(self, shard):
+        return self._set_shard(shard, f"state = '{DONE}', lease_until = NULL")
+
+    def release(self, shard):
+        """give shard back before its lease expires, for a node stopping early"""
+        return self._set_shard(shard, f"state = '{PENDING}', node = NULL, lease_until = NULL")
+
+    def count(self, state):
+        _command = "SELECT count(*) FROM shards WHERE process_type = ? AND shard_count = ? AND state = ?"
+        return self._connection.execute(
+            _command, (self.process_type, self.shard_count, state)
+        ).fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+class Heartbeat:
+    """renews the lease of a shard from a thread while the with block runs"""
+
+    def __init__(self, coordination_location, coordinator, shard):
+        self._coordination_location = coordination_location
+        self._coordinator = coordinator
+        self._shard = shard
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # sqlite connections stay in the thread that opened them
+        coordinator = ShardCoordinator(
+            self._coordination_location,
+            self._coordinator.process_type,
+            self._coordinator.node,
+            self._coordinator.shard_count,
+        )
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            if not coordinator.heartbeat(self._shard):
+                logger.warning(f"shard {self._shard} lease lost")
+        coordinator.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exception):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_node(
+    coordination_location,
+    source=IMDB_DATA_PATH,
+    workers=None,
+    parse_workers=1,
+    use_page_cache=False,
+    shard_count=SHARD_COUNT,
+):
+    """claim shards until none is left and scrape their ids into the local database
+
+    the ids of a shard are streamed from source and queued in the local add
+    WorkQueue, then scraped by orchestrate. merge_database copies the rows of every
+    node into the main database afterwards.
+
+    Args:
+        coordination_location (str): sqlite file shared by every node
+        source (str, optional): see iter_imdb_ids. Defaults to IMDB_DATA_PATH.
+        workers (int, optional): scraping processes of this node. Defaults to the cpu count.
+        parse_workers (int, optional): see orchestrate. Defaults to 1.
+        use_page_cache (bool, optional): see process. Defaults to False.
+        shard_count (int, optional): every node must use the same. Defaults to SHARD_COUNT.
+
+    Returns:
+        list: the shards completed by this node
+    """
+    coordinator = ShardCoordinator(coordination_location, "add", shard_count=shard_count)
+    _completed = []
+    while (shard := coordinator.claim()) is not None:
+        logger.info(f"{coordinator.node} scraping shard {shard}/{shard_count}")
+        with Heartbeat(coordination_location, coordinator, shard):
+            work_queue = WorkQueue("add")
+            work_queue.release_leases()
+            work_queue.add(
+                async_scrapper.filter_unseen_ids(
+                    imdb_id
+                    for imdb_id in iter_imdb_ids(source)
+                    if get_shard(imdb_id, shard_count) == shard
+                )
+            )
+            work_queue.close()
+            stats = orchestrate("add", workers, parse_workers, use_page_cache)
+        if stats["stopped"]:
+            coordinator.release(shard)
+            break
+        if coordinator.complete(shard):
+            _completed.append(shard)
+        else:
+            logger.warning(f"shard {shard} was reassigned before it was completed")
+    coordinator.close()
+    return _completed
+
+
+def merge_database(node_database_location, database_location=None):
+    """copy the rows scraped by a node into the main database
+
+    a row already in the main database is only replaced by a more recent scrape
+
+    Returns:
+        int: rows written
+    """
+    # the connection of the process, with its timeout and pragmas, a scrape or the api
+    # may hold the database meanwhile
+    _database = get_database(database_location or async_scrapper.DATABASE_LOCATION)
+    # outside of the transaction, sqlite cannot attach within one
+    _database.execute("ATTACH DATABASE ? AS node", (node_database_location,))
+    _written = 0
+    try:
+        with _database.transaction() as _connection:
+            for _table_name in async_scrapper.SCRAPED_TABLES:
+                _columns = [
+                    _row[1]
+                    for _row in _connection.execute(f"PRAGMA node.table_info({_table_name})")
+                ]
+                _column_list = ", ".join(_columns)
+                _updates = ", ".join(
+                    f"{_column} = excluded.{_column}" for _column in _columns if _column != "imdb_id"
+                )
+                if "last_scraped_at" in _columns:
+                    _conflict = f"""DO UPDATE SET {_updates} WHERE excluded.last_scraped_at >
+                        coalesce({_table_name}.last_scraped_at, 0)"""
+                else:
+                    _conflict = "DO NOTHING"
+                # WHERE true lets sqlite parse the ON CONFLICT of an INSERT ... SELECT
+                _written += _connection.execute(
+                    f"""INSERT INTO main.{_table_name} ({_column_list})
+                    SELECT {_column_list} FROM node.{_table_name} WHERE true
+                    ON CONFLICT (imdb_id) {_conflict}"""
+                ).rowcount
+                if _table_name in DETAIL_TABLES:
+                    # the rows of the node kept by the main database, their junction rows
+                    # were written by the node from the names its parser listed
+                    _merged = f"""SELECT imdb_id FROM main.{_table_name} AS details
+                        JOIN node.{_table_name} AS node_details USING (imdb_id)
+                        WHERE details.last_scraped_at IS node_details.last_scraped_at"""
+                    dimensions.copy_titles(_connection, "node", _merged)
+                    search.index_search(_connection, _table_name, f"details.imdb_id IN ({_merged})")
+    finally:
+        _database.execute("DETACH DATABASE node")
+    logger.info(f"{_written} rows merged from {node_database_location}")
+    return _written
+
+
+if __name__ == "__main__":
+    print("this is a library to split the scraping over several hosts")
@@ -0,0 +1,99 @@
+# the ratings dataset of the previous run kept as fixed size binary records, in the
+# order of the dataset, so the next download can be diffed against it in one pass
+import logging
+import os
+import struct
+from array import array
+
+from imdb_scrapper.lib.ratings import RATINGS_URL, iter_ratings
+from imdb_scrapper.lib.tconst import decode, encode
+
+CURRENT_DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+
+ROOT_DIRECTORY = os.path.normpath(CURRENT_DIR_PATH + os.sep + os.pardir)
+
+SNAPSHOT_PATH = os.path.join(ROOT_DIRECTORY, "data", "ratings_snapshot.bin")
+
+# imdb id, rating * 10, votes: 10 bytes per title
+RECORD = struct.Struct("<IHI")
+# records read from the snapshot at a time
+READ_RECORDS = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def iter_snapshot(_snapshot_path=SNAPSHOT_PATH):
+    """yield the (imdb_id, rating * 10, votes) records of a snapshot, none if it does not exist"""
+    if not os.path.exists(_snapshot_path):
+        return
+    with open(_snapshot_path, "rb") as file:
+        while _chunk := file.read(RECORD.size * READ_RECORDS):
+            yield from RECORD.iter_unpack(_chunk)
+
+
+def iter_dataset_records(_source=RATINGS_URL):
+    """the ratings dataset as snapshot records"""
+    for _tconst, _rating, _votes in iter_ratings(_source):
+        yield encode(_tconst), round(_rating * 10), _votes
+
+
+def diff_snapshot(_source=RATINGS_URL, _snapshot_path=SNAPSHOT_PATH):
+    """sorted merge of the dataset against the previous snapshot, streamed on both sides
+
+    the dataset is sorted by tconst as text (tt10000000 comes before tt9999999), the
+    snapshot keeps that order and both sides are compared on it. the new snapshot is
+    written next to the previous one while the dataset is read, commit_snapshot
+    replaces the previous one once the diff has been used.
+
+    Args:
+        _source (str, optional): url or path of title.ratings.tsv(.gz). Defaults to RATINGS_URL.
+        _snapshot_path (str, optional): previous snapshot. Defaults to SNAPSHOT_PATH.
+
+    Raises:
+        ValueError: the dataset is not sorted by tconst
+
+    Returns:
+        tuple: (added, changed, removed, new snapshot path), the ids are array("I")
+    """
+    _added, _changed, _removed = array("I"), array("I"), array("I")
+    _new_snapshot_path = f"{_snapshot_path}.new"
+    _old_records = iter_snapshot(_snapshot_path)
+
+    def _next_old():
+        _record = next(_old_records, None)
+        return _record, decode(_record[0]) if _record else None
+
+    _old, _old_key = _next_old()
+    _previous_key = ""
+    with open(_new_snapshot_path, "wb") as file:
+        for _record in iter_dataset_records(_source):
+            _key = decode(_record[0])
+            if _key <= _previous_key:
+                raise ValueError(f"{_source} is not sorted by tconst at {_key}")
+            _previous_key = _key
+            file.write(RECORD.pack(*_record))
+            while _old is not None and _old_key < _key:
+                _removed.append(_old[0])
+                _old, _old_key = _next_old()
+            if _old is not None and _old_key == _key:
+                if _old[1:] != _record[1:]:
+                    _changed.append(_record[0])
+                _old, _old_key = _next_old()
+            else:
+                _added.append(_record[0])
+        while _old is not None:
+            _removed.append(_old[0])
+            _old, _old_key = _next_old()
+    logger.info(
+        f"snapshot diff: {len(_added)} added, {len(_changed)} changed, {len(_removed)} removed"
+    )
+    return _added, _changed, _removed, _new_snapshot_path
+
+
+def commit_snapshot(_new_snapshot_path, _snapshot_path=SNAPSHOT_PATH):
+    """make the snapshot written by diff_snapshot the one the next run diffs against"""
+    os.replace(_new_snapshot_path, _snapshot_path)
+
+
+if __name__ == "__main__":
+    print("this is a library to diff the imdb ratings dataset between two runs")
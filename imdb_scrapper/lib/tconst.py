@@ -0,0 +1,75 @@
+# imdb ids (tconst) as plain ints, tt1234567 <-> 1234567, so the millions of ids
+# of a dump fit in a bitmap instead of a set of url strings
+import re
+
+IMDB_BASE_PATH = "https://www.imdb.com/title/"
+
+TCONST_PREFIX = "tt"
+# digits of the shortest tconst, shorter numbers are padded with zeros
+TCONST_DIGITS = 7
+
+TITLE_PATTERN = re.compile(r"/title/(tt[0-9]+)")
+
+
+def encode(_tconst):
+    """tt1234567 -> 1234567, an int is returned as it is"""
+    if isinstance(_tconst, int):
+        return _tconst
+    return int(_tconst[len(TCONST_PREFIX) :])
+
+
+def decode(_number):
+    """1234567 -> tt1234567"""
+    return f"{TCONST_PREFIX}{_number:0{TCONST_DIGITS}d}"
+
+
+def to_url(_tconst, _base_path=IMDB_BASE_PATH):
+    """the title url of an id, int or tconst, built only when it is fetched"""
+    if isinstance(_tconst, int):
+        _tconst = decode(_tconst)
+    return f"{_base_path}{_tconst}"
+
+
+def from_url(_link):
+    """the tconst of a title url"""
+    return TITLE_PATTERN.search(_link).group(1)
+
+
+class IdBitmap:
+    """a set of ids stored one bit per possible id, about 4 MB for every current tconst"""
+
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self._count = 0
+        self.update(ids)
+
+    def add(self, _tconst):
+        _number = encode(_tconst)
+        _byte, _bit = divmod(_number, 8)
+        if _byte >= len(self._bits):
+            self._bits.extend(bytes(max(_byte + 1 - len(self._bits), len(self._bits))))
+        if not self._bits[_byte] & (1 << _bit):
+            self._bits[_byte] |= 1 << _bit
+            self._count += 1
+
+    def update(self, ids):
+        for _tconst in ids:
+            self.add(_tconst)
+
+    def __contains__(self, _tconst):
+        _byte, _bit = divmod(encode(_tconst), 8)
+        return _byte < len(self._bits) and bool(self._bits[_byte] & (1 << _bit))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for _byte, _value in enumerate(self._bits):
+            if _value:
+                for _bit in range(8):
+                    if _value & (1 << _bit):
+                        yield _byte * 8 + _bit
+
+
+if __name__ == "__main__":
+    print("this is a library to convert imdb ids to and from ints")
@@ -1,25 +1,27 @@
 import gc
-import gzip
+import json
 import logging
 import multiprocessing
 import os
-import shutil
 import time
-import urllib.request
 import datetime
 import re
+from imdb_scrapper.lib import async_scrapper
+from imdb_scrapper.lib.database import get_database
 from imdb_scrapper.lib.imdb import Imdb, ImdbMovie, ImdbSerie
-from imdb_scrapper.lib.imdb_id import (
-    write_imdb_url,
-    get_imdb_urls_dump_path,
-    MAX_CHUNK_LENGHT,
-    read_imdb_dump,
-)
+from imdb_scrapper.lib.imdb_id import MAX_CHUNK_LENGHT
+from imdb_scrapper.lib.ratings import RATINGS_URL, iter_ratings, save_ratings
+from imdb_scrapper.lib.scheduler import REFRESH_BUDGET
+from imdb_scrapper.lib.snapshot import SNAPSHOT_PATH, commit_snapshot, diff_snapshot
+from imdb_scrapper.lib.tconst import decode
+from imdb_scrapper.lib.work_queue import WorkQueue
 from imdb_scrapper.lib.async_scrapper import (
     process,
     set_up_database,
     slice_list,
     database_excute_command,
+    filter_unseen_ids,
+    get_scraped_ids,
 )
 
 
@@ -29,8 +31,6 @@ ROOT_DIRECTORY = os.path.normpath(CURRENT_DIR_PATH + os.sep + os.pardir)
 
 DATA_ROOT_DIR = os.path.join(ROOT_DIRECTORY, "data")
 
-ZIP_DIR_PATH = os.path.join(DATA_ROOT_DIR, "title.ratings.tsv.gz")
-
 DATA_OUTPUT_PATH = os.path.join(DATA_ROOT_DIR, "data.tsv")
 
 logging.basicConfig(
@@ -39,65 +39,158 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# rows of the ratings dataset applied per transaction
+RATINGS_BATCH = 50000
+# a serie whose years are still open, or unknown, may have a new season or an end year
+OPEN_SERIE_CONDITION = """(serie.years IS NULL OR serie.years = 'NA'
+    OR serie.years LIKE '%–' OR serie.years LIKE '%-')"""
+
+
+def get_imdb_data_path(_source=RATINGS_URL):
+    """save the uncompressed dataset to data.tsv, decompressed while it downloads"""
+    return save_ratings(_source, DATA_OUTPUT_PATH)
+
+
+def _apply_ratings_batch(_connection, _batch):
+    _connection.execute("DELETE FROM ratings_batch")
+    _connection.executemany("INSERT INTO ratings_batch VALUES (?, ?, ?)", _batch)
+    _changed = "(details.score IS NOT ratings_batch.score OR details.voters IS NOT ratings_batch.voters)"
+    # read before the update, once it ran nothing tells which series changed
+    _open_series = _connection.execute(
+        f"""SELECT serie.imdb_id FROM serie_details serie JOIN ratings_batch USING (imdb_id)
+        WHERE (serie.score IS NOT ratings_batch.score OR serie.voters IS NOT ratings_batch.voters)
+        AND {OPEN_SERIE_CONDITION}"""
+    ).fetchall()
+    _updated = 0
+    for _table_name in ("movie_details", "serie_details"):
+        _updated += _connection.execute(
+            f"""UPDATE {_table_name} AS details SET score = ratings_batch.score, voters = ratings_batch.voters
+            FROM ratings_batch WHERE details.imdb_id = ratings_batch.imdb_id AND {_changed}"""
+        ).rowcount
+    return _updated, [_row[0] for _row in _open_series]
+
+
+def refresh_ratings(_source=RATINGS_URL, batch_size=RATINGS_BATCH):
+    """copy score and voters of the ratings dataset into both tables, without scraping
+
+    the dataset is streamed and applied batch_size rows per transaction, rows whose
+    values did not change are not written. the series still running whose rating
+    changed are queued in the update WorkQueue, their years and seasons can only
+    be read from their page.
+
+    Args:
+        _source (str, optional): url or path of title.ratings.tsv(.gz). Defaults to RATINGS_URL.
+        batch_size (int, optional): rows per transaction. Defaults to RATINGS_BATCH.
+
+    Returns:
+        tuple: (rows read, rows updated, series queued)
+    """
+    _database = get_database(async_scrapper.DATABASE_LOCATION)
+    _database.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS ratings_batch (imdb_id TEXT PRIMARY KEY, score FLOAT, voters INT)"
+    )
+    work_queue = WorkQueue("update")
+    _read, _updated, _queued = 0, 0, 0
+    _batch = []
+
+    def _flush():
+        nonlocal _updated, _queued
+        with _database.transaction() as _connection:
+            _batch_updated, _open_series = _apply_ratings_batch(_connection, _batch)
+        _updated += _batch_updated
+        if _open_series:
+            work_queue.add(_open_series, reset_done=True)
+            _queued += len(_open_series)
+        _batch.clear()
+
+    for _tconst, _rating, _votes in iter_ratings(_source):
+        _batch.append((_tconst, _rating, _votes))
+        _read += 1
+        if len(_batch) >= batch_size:
+            _flush()
+    if _batch:
+        _flush()
+    _database.execute("DROP TABLE temp.ratings_batch")
+    work_queue.close()
+    logger.info(f"{_read} ratings read, {_updated} rows updated, {_queued} series queued")
+    return _read, _updated, _queued
+
+
+def queue_snapshot_diff(_source=RATINGS_URL, _snapshot_path=SNAPSHOT_PATH):
+    """queue only what changed in the ratings dataset since the previous run
+
+    the titles new to the dataset go to the add WorkQueue, the scraped titles whose
+    rating or votes changed go to the update one. the titles that disappeared are
+    only counted, their rows are kept.
+
+    Returns:
+        tuple: (added, changed, removed) counts of the diff
+    """
+    _added, _changed, _removed, _new_snapshot_path = diff_snapshot(_source, _snapshot_path)
+    _scraped_ids = get_scraped_ids()
+    work_queue = WorkQueue("add")
+    work_queue.add(filter_unseen_ids(_added, _scraped_ids))
+    work_queue.close()
+    work_queue = WorkQueue("update")
+    work_queue.add(
+        (imdb_id for imdb_id in _changed if imdb_id in _scraped_ids), reset_done=True
+    )
+    work_queue.close()
+    # only once both queues hold the diff, a failed run diffs against the old snapshot again
+    commit_snapshot(_new_snapshot_path, _snapshot_path)
+    return len(_added), len(_changed), len(_removed)
+
+
+def list_due_for_update(budget=REFRESH_BUDGET) -> int:
+    """queue the budget titles most overdue for a scrape, read from the next_due_at index
 
-def download_data(url):
-    try:
-        with urllib.request.urlopen(url) as file:
-            response = file.read()
-        return response
-    except urllib.error.HTTPError:
-        return None
-    except urllib.error.URLError:
-        return None
-
-
-def save_file(response, path):
-    try:
-        with open(path, "wb") as file:
-            file.write(response)
-        return path
-    except IOError:
-        return None
-
-
-def unzip(zip_path, output_path):
-    try:
-        with gzip.open(zip_path, "rb") as file:
-            with open(output_path, "wb") as file_out:
-                shutil.copyfileobj(file, file_out)
-        return output_path
-    except IOError:
-        return None
-
-
-def get_imdb_data_path():
-    url = "https://datasets.imdbws.com/title.ratings.tsv.gz"
-    response = download_data(url)
-    zip_path = save_file(response, ZIP_DIR_PATH)
-    data_path = unzip(zip_path, DATA_OUTPUT_PATH)
-    if data_path:
-        os.remove(zip_path)
-        return data_path
-    else:
-        return None
-
-
-def filter_list(_list, base_year):
-    imdb_base_path = "https://www.imdb.com/title/"
-    filtered_list = []
-    for _row in iter(_list):
-        date = _row[1]
-        if "NA" and "Not Rated" and "PG" not in date:
-            match date.split("-"):
-                case [year, month, day]:
-                    media_year = int(year)
-                case [year, month]:
-                    media_year = int(year)
-                case [year] if int():
-                    media_year = int(year)
-            if media_year >= base_year:
-                filtered_list.append(f"{imdb_base_path}{_row[0]}")
-    return filtered_list
+    Args:
+        budget (int, optional): titles queued at most. Defaults to REFRESH_BUDGET.
+
+    Returns:
+        int: number of titles queued
+    """
+    _now = time.time()
+    _due_query = """SELECT imdb_id, next_due_at FROM {table_name}
+        WHERE next_due_at <= {now} ORDER BY next_due_at LIMIT {budget}"""
+    query = f"""SELECT * FROM ({_due_query.format(table_name="movie_details", now=_now, budget=budget)})
+        UNION ALL SELECT * FROM ({_due_query.format(table_name="serie_details", now=_now, budget=budget)})
+        ORDER BY next_due_at LIMIT {budget}"""
+    _rows = database_excute_command(query, "fetch_all") or []
+    work_queue = WorkQueue("update")
+    work_queue.add((_row[0] for _row in _rows), reset_done=True)
+    work_queue.close()
+    return len(_rows)
+
+
+def postpone_failed_refreshes(_since) -> int:
+    """push back the titles of the finished update run that were not scraped again, their
+    page gone, unparsable or without details, so they do not come first in every
+    list_due_for_update. the finished ids are removed from the update queue.
+
+    Args:
+        _since (float): timestamp at which the update run started
+
+    Returns:
+        int: number of titles pushed back
+    """
+    work_queue = WorkQueue("update")
+    _imdb_ids = json.dumps([decode(imdb_id) for imdb_id in work_queue.pop_finished()])
+    work_queue.close()
+    _database = get_database(async_scrapper.DATABASE_LOCATION)
+    _now = time.time()
+    _postponed = 0
+    for _table_name in ("movie_details", "serie_details"):
+        # a refresh that wrote its row moved last_scraped_at and next_due_at already
+        _postponed += _database.execute(
+            f"""UPDATE {_table_name} SET failed_refreshes = failed_refreshes + 1,
+            next_due_at = failed_due_at(failed_refreshes, ?)
+            WHERE imdb_id IN (SELECT value FROM json_each(?))
+            AND coalesce(last_scraped_at, 0) < ? AND coalesce(next_due_at, 0) <= ?""",
+            (_now, _imdb_ids, _since, _now),
+        ).rowcount
+    logger.info(f"{_postponed} titles whose refresh failed are pushed back")
+    return _postponed
 
 
 def get_year_to_update_from(number_of_years):
@@ -116,15 +209,18 @@ def get_year_to_update_from(number_of_years):
 
 def list_to_be_updated(number_of_years) -> None:
     def _helper(_table_name):
-        query = f""" SELECT imdb_id, release_date from {_table_name}"""
-        _rows = database_excute_command(query, "fetch_all")
+        # read from the release_year index, a title without a known year is left out
+        query = f""" SELECT imdb_id from {_table_name} WHERE release_year >= ?"""
         base_year = get_year_to_update_from(number_of_years)
-        return filter_list(_rows, base_year)
+        _rows = database_excute_command(query, "fetch_all", (base_year,))
+        return [_row[0] for _row in _rows]
 
     movies_list = _helper("movie_details")
     series_list = _helper("serie_details")
     _list_to_be_updated = movies_list + series_list
-    write_imdb_url(_list_to_be_updated)
+    work_queue = WorkQueue("update")
+    work_queue.add(_list_to_be_updated, reset_done=True)
+    work_queue.close()
     del movies_list
     del series_list
     del _list_to_be_updated
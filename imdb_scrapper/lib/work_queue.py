@@ -0,0 +1,215 @@
+# imdb ids waiting to be scraped, kept as ints in one indexed sqlite table with their
+# state, claimed in batches under a lease so a crashed run resumes where it stopped
+import logging
+import os
+import sqlite3
+import time
+
+from imdb_scrapper.lib.tconst import encode
+
+CURRENT_DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+
+ROOT_DIRECTORY = os.path.normpath(CURRENT_DIR_PATH + os.sep + os.pardir)
+
+WORK_QUEUE_LOCATION = os.path.join(ROOT_DIRECTORY, "database", "work_queue.db")
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# seconds a claimed batch stays leased before another worker may claim it again
+LEASE_SECONDS = 600
+# ids added per transaction when filling the queue
+INSERT_BATCH = 10000
+# finished ids buffered before their state is written
+FLUSH_BATCH = 100
+
+os.makedirs(os.path.dirname(WORK_QUEUE_LOCATION), exist_ok=True)
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """the ids of one process_type, every process or host sharing the file can claim from it"""
+
+    def __init__(self, process_type="add", database_location=None):
+        self.process_type = process_type
+        self._connection = sqlite3.connect(
+            database_location or WORK_QUEUE_LOCATION, timeout=60, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS work_queue (process_type TEXT NOT NULL, imdb_id INTEGER NOT NULL,
+            state TEXT NOT NULL, lease_until FLOAT, attempts INT DEFAULT 0,
+            PRIMARY KEY (process_type, imdb_id)) WITHOUT ROWID"""
+        )
+        self._connection.execute(
+            """CREATE INDEX IF NOT EXISTS work_queue_claim
+            ON work_queue (process_type, state, lease_until)"""
+        )
+        self._finished = {DONE: [], FAILED: []}
+
+    def _executemany(self, _command, _rows):
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.executemany(_command, _rows)
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def add(self, imdb_ids, reset_done=False):
+        """queue imdb_ids, consumed lazily so it can be a generator
+
+        Args:
+            imdb_ids (iterable): ids to queue, ints or tconsts, ids already queued are kept as they are
+            reset_done (bool, optional): queue the ids already done or failed again. Defaults to False.
+        """
+        _command = f"""INSERT INTO work_queue (process_type, imdb_id, state) VALUES (?, ?, '{PENDING}')
+            ON CONFLICT (process_type, imdb_id) DO """
+        _command += (
+            f"UPDATE SET state = '{PENDING}', attempts = 0 WHERE state IN ('{DONE}', '{FAILED}')"
+            if reset_done
+            else "NOTHING"
+        )
+        _batch = []
+        _count = 0
+        for imdb_id in imdb_ids:
+            _batch.append((self.process_type, encode(imdb_id)))
+            if len(_batch) >= INSERT_BATCH:
+                self._executemany(_command, _batch)
+                _count += len(_batch)
+                _batch = []
+        if _batch:
+            self._executemany(_command, _batch)
+            _count += len(_batch)
+        logger.info(f"{_count} ids queued for {self.process_type}")
+
+    def claim(self, batch_size, lease_seconds=LEASE_SECONDS):
+        """lease up to batch_size pending ids, or ids whose lease expired, to this process
+
+        Returns:
+            list: the ids as ints
+        """
+        _now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            _rows = self._connection.execute(
+                f"""SELECT imdb_id FROM work_queue WHERE process_type = ? AND
+                (state = '{PENDING}' OR (state = '{LEASED}' AND lease_until < ?)) LIMIT ?""",
+                (self.process_type, _now, batch_size),
+            ).fetchall()
+            self._connection.executemany(
+                f"""UPDATE work_queue SET state = '{LEASED}', lease_until = ?, attempts = attempts + 1
+                WHERE process_type = ? AND imdb_id = ?""",
+                [(_now + lease_seconds, self.process_type, _row[0]) for _row in _rows],
+            )
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return [_row[0] for _row in _rows]
+
+    def iter_claims(self, batch_size, _filter=None, _stop=None):
+        """yield claimed ids batch after batch until the queue is empty
+
+        Args:
+            batch_size (int or function): ids claimed at a time, or a function returning
+                the size of the next claim. the next batch is only claimed once the
+                previous one was consumed
+            _filter (function, optional): given a batch, returns the ids still worth
+                scraping, the others are marked as done right away.
+            _stop (function, optional): returns True once no more id should be handed
+                out, the ids of the batch not handed out yet go back to pending.
+        """
+        while _batch := self.claim(batch_size() if callable(batch_size) else batch_size):
+            if _filter:
+                _kept = _filter(_batch)
+                _kept_set = set(_kept)
+                for imdb_id in _batch:
+                    if imdb_id not in _kept_set:
+                        self.complete(imdb_id)
+                _batch = _kept
+            for _index, imdb_id in enumerate(_batch):
+                if _stop and _stop():
+                    self.release(_batch[_index:])
+                    return
+                yield imdb_id
+
+    def release(self, imdb_ids):
+        """put leased ids back to pending before their lease expires"""
+        self._executemany(
+            f"UPDATE work_queue SET state = '{PENDING}', lease_until = NULL WHERE process_type = ? AND imdb_id = ?",
+            [(self.process_type, encode(imdb_id)) for imdb_id in imdb_ids],
+        )
+
+    def release_leases(self):
+        """put every leased id back to pending, for a run that knows no other worker is alive"""
+        self._connection.execute(
+            f"UPDATE work_queue SET state = '{PENDING}', lease_until = NULL WHERE process_type = ? AND state = '{LEASED}'",
+            (self.process_type,),
+        )
+
+    def _finish(self, imdb_id, _state):
+        self._finished[_state].append(encode(imdb_id))
+        if len(self._finished[_state]) >= FLUSH_BATCH:
+            self.flush()
+
+    def complete(self, imdb_id):
+        self._finish(imdb_id, DONE)
+
+    def fail(self, imdb_id):
+        self._finish(imdb_id, FAILED)
+
+    def flush(self):
+        for _state, _ids in self._finished.items():
+            if _ids:
+                self._executemany(
+                    "UPDATE work_queue SET state = ?, lease_until = NULL WHERE process_type = ? AND imdb_id = ?",
+                    [(_state, self.process_type, imdb_id) for imdb_id in _ids],
+                )
+                _ids.clear()
+
+    def pop_finished(self):
+        """remove the ids done or failed from the queue
+
+        Returns:
+            list: the ids as ints
+        """
+        self.flush()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            _rows = self._connection.execute(
+                f"SELECT imdb_id FROM work_queue WHERE process_type = ? AND state IN ('{DONE}', '{FAILED}')",
+                (self.process_type,),
+            ).fetchall()
+            self._connection.execute(
+                f"DELETE FROM work_queue WHERE process_type = ? AND state IN ('{DONE}', '{FAILED}')",
+                (self.process_type,),
+            )
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return [_row[0] for _row in _rows]
+
+    def count(self, state=None):
+        if state is None:
+            _command = "SELECT count(*) FROM work_queue WHERE process_type = ?"
+            return self._connection.execute(_command, (self.process_type,)).fetchone()[0]
+        _command = "SELECT count(*) FROM work_queue WHERE process_type = ? AND state = ?"
+        return self._connection.execute(_command, (self.process_type, state)).fetchone()[0]
+
+    def has_work(self):
+        """True while ids are pending or leased, a run that stopped early left some"""
+        return bool(self.count(PENDING) or self.count(LEASED))
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+
+if __name__ == "__main__":
+    print("this is a library to queue the imdb ids to scrape")
@@ -0,0 +1,230 @@
+# one process owning every write to the database: the scraping processes hand it their
+# records over a bounded queue and it commits them in groups, so writers never wait
+# on each other's locks and readers only ever see one writer
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import statistics
+import time
+
+from imdb_scrapper.lib import async_scrapper
+from imdb_scrapper.lib.database import get_database
+from imdb_scrapper.lib.work_queue import WorkQueue
+
+# records waiting to be written, a scraper handing over one more blocks until there is room
+WRITER_QUEUE_SIZE = 1000
+# records committed per transaction at most
+GROUP_COMMIT_SIZE = 500
+# seconds the writer waits for more records before committing what it has
+GROUP_COMMIT_WAIT = 0.05
+STATS_SECONDS = 30
+LATENCY_SAMPLES = 10000
+WRITER_STOP = None
+
+logger = logging.getLogger(__name__)
+
+
+def _get_percentile(_values, _percentile):
+    if len(_values) < 2:
+        return _values[0] if _values else 0
+    return statistics.quantiles(_values, n=100)[_percentile - 1]
+
+
+class _WriterStats:
+    def __init__(self):
+        self.records = 0
+        self.rows = 0
+        self.failed = 0
+        self.groups = 0
+        self.max_queue_depth = 0
+        # seconds from a record handed over to its commit
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def get_stats(self):
+        _latencies = list(self.latencies)
+        return {
+            "records": self.records,
+            "rows": self.rows,
+            "failed": self.failed,
+            "groups": self.groups,
+            "records_per_group": self.records / self.groups if self.groups else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "latency_p50": _get_percentile(_latencies, 50),
+            "latency_p99": _get_percentile(_latencies, 99),
+        }
+
+
+def _get_group(_queue):
+    """the next records, as many as arrive within GROUP_COMMIT_WAIT of the first one"""
+    _group = [_queue.get()]
+    _deadline = time.monotonic() + GROUP_COMMIT_WAIT
+    while len(_group) < GROUP_COMMIT_SIZE and _group[-1] is not WRITER_STOP:
+        try:
+            _group.append(_queue.get(timeout=max(0, _deadline - time.monotonic())))
+        except queue.Empty:
+            break
+    return _group
+
+
+def _run_writer(_queue, _stats_queue, _database_location, _alive):
+    try:
+        _write_records(_queue, _stats_queue, _database_location)
+    finally:
+        # a scraper blocked on a full queue gives up instead of waiting forever, a writer
+        # killed never gets here, see WriterService.is_alive
+        _alive.clear()
+
+
+def _write_records(_queue, _stats_queue, _database_location):
+    # the scrapers decide when to stop, every record they handed over is written
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    database = get_database(_database_location or async_scrapper.DATABASE_LOCATION)
+    stats = _WriterStats()
+    work_queues = {}
+    _logged_at = time.monotonic()
+    _running = True
+    while _running:
+        _group = _get_group(_queue)
+        stats.max_queue_depth = max(stats.max_queue_depth, _queue.qsize() + len(_group))
+        if _group[-1] is WRITER_STOP:
+            _group.pop()
+            _running = False
+        _finished = {True: [], False: []}
+        # (written, failed) keys, a write flushing a full batch returns those of the batch
+        _flushed = []
+        _index_commands = []
+        for _enqueued_at, process_type, details, _use_queue in _group:
+            stats.records += 1
+            _command = async_scrapper.get_write_command(details, process_type)
+            _key = (_enqueued_at, process_type, details.imdb_id, _use_queue)
+            if _command:
+                _flushed.append(database.write(*_command, key=_key))
+                _index_commands.append(
+                    async_scrapper.get_index_commands(details, process_type)
+                )
+            else:
+                # nothing to write for this process_type
+                _finished[True].append(_key)
+        # the nth statement of every record after the n-1th ones, the records of a class
+        # share them so they run through executemany
+        for _commands in itertools.zip_longest(*_index_commands):
+            for _command in _commands:
+                if _command:
+                    _flushed.append(database.write(*_command))
+        _flushed.append(database.flush())
+        _written = [_key for _keys in _flushed for _key in _keys[0]]
+        _failed = [_key for _keys in _flushed for _key in _keys[1]]
+        stats.groups += bool(_group)
+        stats.rows += len(_written)
+        stats.failed += len(_failed)
+        _now = time.time()
+        _finished[True].extend(_written)
+        _finished[False].extend(_failed)
+        for _succeeded, _keys in _finished.items():
+            for _enqueued_at, process_type, imdb_id, _use_queue in _keys:
+                stats.latencies.append(_now - _enqueued_at)
+                if not _use_queue:
+                    continue
+                if process_type not in work_queues:
+                    work_queues[process_type] = WorkQueue(process_type)
+                if _succeeded:
+                    work_queues[process_type].complete(imdb_id)
+                else:
+                    work_queues[process_type].fail(imdb_id)
+        for work_queue in work_queues.values():
+            work_queue.flush()
+        if time.monotonic() - _logged_at > STATS_SECONDS:
+            logger.info(f"writer stats: {stats.get_stats()}")
+            _logged_at = time.monotonic()
+    for work_queue in work_queues.values():
+        work_queue.close()
+    _stats_queue.put(stats.get_stats())
+
+
+class WriterService:
+    """the writer process and the queue feeding it, start it before the scraping processes
+    are forked so they inherit the queue"""
+
+    def __init__(self, database_location=None, queue_size=WRITER_QUEUE_SIZE):
+        self._database_location = database_location
+        self._queue = multiprocessing.Queue(maxsize=queue_size)
+        self._stats_queue = multiprocessing.Queue()
+        self._alive = multiprocessing.Event()
+        self._process = None
+        self._owner_pid = None
+
+    def start(self):
+        self._alive.set()
+        self._owner_pid = os.getpid()
+        self._process = multiprocessing.Process(
+            target=_run_writer,
+            args=(self._queue, self._stats_queue, self._database_location, self._alive),
+        )
+        self._process.start()
+        return self
+
+    def is_alive(self):
+        """False once the writer process ended, killed included. only the process that
+        started it sees it exit, it clears the flag the scraping processes read"""
+        if os.getpid() == self._owner_pid and not self._process.is_alive():
+            self._alive.clear()
+        return self._alive.is_set()
+
+    def put(self, details, process_type="add", use_queue=True):
+        """hand a record over, blocks while the writer is WRITER_QUEUE_SIZE records behind
+
+        Args:
+            details (Imdb): the record
+            process_type (str, optional): [either add, replace or update]. Defaults to 'add'.
+            use_queue (bool, optional): mark the id done, or failed, in the WorkQueue of
+                process_type once committed. Defaults to True.
+
+        Raises:
+            RuntimeError: the writer process ended
+        """
+        _message = (time.time(), process_type, details, use_queue)
+        while True:
+            if not self.is_alive():
+                raise RuntimeError("the writer process ended")
+            try:
+                self._queue.put(_message, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def exitcode(self):
+        return self._process.exitcode
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        """write what is left and stop the writer
+
+        Returns:
+            dict: records, rows, failed, groups, records_per_group, max_queue_depth and
+                the p50 and p99 seconds from a record handed over to its commit
+        """
+        while self.is_alive():
+            try:
+                self._queue.put(WRITER_STOP, timeout=1)
+                break
+            except queue.Full:
+                continue
+        self._process.join()
+        try:
+            stats = self._stats_queue.get(timeout=5)
+        except queue.Empty:
+            logger.warning("the writer process ended without its stats")
+            stats = {}
+        logger.info(f"writer stats: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    print("this is a library to write every record from a single process")
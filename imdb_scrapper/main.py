@@ -1,21 +1,18 @@
 # add it to logging.basicConfig to change output from console to a log file, filename=LOG_LOCATION
-import gc
+import argparse
 import logging
-import multiprocessing
 import os
 import time
 
 from imdb_scrapper.lib.async_scrapper import (
-    process,
+    reparse_cached_pages,
     set_up_database,
-    slice_list,
-    clean_urls,
-)
-from imdb_scrapper.lib.imdb_id import (
-    MAX_CHUNK_LENGHT,
-    get_imdb_urls_dump_path,
-    read_imdb_dump,
+    filter_unseen_ids,
 )
+from imdb_scrapper.lib.imdb_id import MAX_CHUNK_LENGHT, IMDB_DATA_PATH, iter_imdb_ids
+from imdb_scrapper.lib.orchestrator import orchestrate
+from imdb_scrapper.lib.shards import SHARD_COUNT, merge_database, run_node
+from imdb_scrapper.lib.work_queue import WorkQueue
 
 
 logging.basicConfig(
@@ -25,41 +22,97 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
+def get_arguments():
+    parser = argparse.ArgumentParser(description="scrape every imdb title in data.tsv")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of scraping processes, of parse processes with --from-cache (default: cpu count)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="number of parse processes of each scraping process (default: 1)",
+    )
+    parser.add_argument(
+        "--source",
+        default=IMDB_DATA_PATH,
+        help="data.tsv, title.ratings.tsv.gz or its url, streamed to fill the queue (default: data.tsv)",
+    )
+    parser.add_argument(
+        "--page-cache",
+        action="store_true",
+        help="keep the raw pages on disk and revalidate them instead of downloading them again",
+    )
+    parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="parse the pages of the page cache again instead of scraping, no network is used",
+    )
+    parser.add_argument(
+        "--coordinator",
+        default=None,
+        help="sqlite file shared by several hosts, this host scrapes the shards it claims in it",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=SHARD_COUNT,
+        help=f"number of shards with --coordinator, the same on every host (default: {SHARD_COUNT})",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        default=None,
+        metavar="NODE_DATABASE",
+        help="copy the rows scraped by other hosts into the database instead of scraping",
+    )
+    return parser.parse_args()
+
+
+def main(workers=None, use_page_cache=False, source=IMDB_DATA_PATH, parse_workers=1):
     logger.info(f"The program will be processing by chunks of {MAX_CHUNK_LENGHT} item")
     set_up_database()
     _start_time = time.time()
     logger.info(f"Program started {(time.time() - _start_time)} seconds ---")
 
-    imdb_ids_path = get_imdb_urls_dump_path()
-    for _dump_path in imdb_ids_path:
-        raw_urls = read_imdb_dump(_dump_path)
-        urls = slice_list(clean_urls(raw_urls))
-        if not urls:
-            continue
-        process_one = multiprocessing.Process(
-            target=process,
-            args=(
-                urls[0],
-                "add",
-            ),
-        )
-        process_two = multiprocessing.Process(
-            target=process,
-            args=(
-                urls[1],
-                "add",
-            ),
-        )
-        process_one.start()
-        process_two.start()
-        process_one.join()
-        process_two.join()
-        os.remove(_dump_path)
-        del raw_urls
-        gc.collect()
+    work_queue = WorkQueue("add")
+    # nothing else works on the queue, whatever is leased was left by a run that stopped
+    work_queue.release_leases()
+    if work_queue.has_work():
+        logger.info("resuming the previous run")
+    else:
+        work_queue.add(filter_unseen_ids(iter_imdb_ids(source)))
+    work_queue.close()
+    orchestrate("add", workers, parse_workers, use_page_cache)
     logger.info(f"Program ended {(time.time() - _start_time)} seconds ---")
 
 
 if __name__ == "__main__":
-    main()
+    arguments = get_arguments()
+    if arguments.from_cache:
+        set_up_database()
+        reparse_cached_pages(workers=arguments.workers)
+    elif arguments.merge:
+        set_up_database()
+        for node_database_location in arguments.merge:
+            merge_database(node_database_location)
+    elif arguments.coordinator:
+        set_up_database()
+        run_node(
+            arguments.coordinator,
+            arguments.source,
+            arguments.workers,
+            arguments.parse_workers,
+            arguments.page_cache,
+            arguments.shards,
+        )
+    else:
+        main(
+            arguments.workers,
+            arguments.page_cache,
+            arguments.source,
+            arguments.parse_workers,
+        )
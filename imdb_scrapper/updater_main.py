@@ -1,15 +1,21 @@
-import gc
+import argparse
 import logging
-import multiprocessing
 import os
 import time
-from imdb_scrapper.lib.async_scrapper import process, slice_list
-from imdb_scrapper.lib.imdb_id import (
-    MAX_CHUNK_LENGHT,
-    get_imdb_urls_dump_path,
-    read_imdb_dump,
+from imdb_scrapper.lib.async_scrapper import set_up_database
+from imdb_scrapper.lib.imdb_id import MAX_CHUNK_LENGHT
+from imdb_scrapper.lib.orchestrator import orchestrate
+from imdb_scrapper.lib.ratings import RATINGS_URL
+from imdb_scrapper.lib.scheduler import REFRESH_BUDGET
+from imdb_scrapper.lib.updater import (
+    get_imdb_data_path,
+    list_due_for_update,
+    list_to_be_updated,
+    postpone_failed_refreshes,
+    queue_snapshot_diff,
+    refresh_ratings,
 )
-from imdb_scrapper.lib.updater import get_imdb_data_path, list_to_be_updated
+from imdb_scrapper.lib.work_queue import WorkQueue
 
 logging.basicConfig(
     format="%(levelname)s:%(message)s", encoding="utf-8", level=logging.INFO
@@ -18,40 +24,94 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
+def get_arguments():
+    parser = argparse.ArgumentParser(description="refresh recently released titles")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of scraping processes (default: cpu count)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="number of parse processes of each scraping process (default: 1)",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        default=None,
+        help="refresh every title released in the last n years instead of the titles due",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=REFRESH_BUDGET,
+        help=f"titles due for a refresh scraped at most (default: {REFRESH_BUDGET})",
+    )
+    parser.add_argument(
+        "--from-ratings",
+        action="store_true",
+        help="take score and voters from the ratings dataset instead of the pages, only the running series whose rating changed are scraped",
+    )
+    parser.add_argument(
+        "--source",
+        default=RATINGS_URL,
+        help="url or path of title.ratings.tsv(.gz) used by --from-ratings and --from-snapshot (default: the imdb dataset url)",
+    )
+    parser.add_argument(
+        "--from-snapshot",
+        action="store_true",
+        help="diff the ratings dataset against the previous run, scrape the new titles and update the changed ones",
+    )
+    parser.add_argument(
+        "--page-cache",
+        action="store_true",
+        help="send conditional requests for the pages kept in the page cache",
+    )
+    return parser.parse_args()
+
+
+def main(workers=None, use_page_cache=False, scrape_new=False, parse_workers=1):
     logger.info(f"The program will be processing by chunks of {MAX_CHUNK_LENGHT} item")
     _start_time = time.time()
     logger.info(f"Program started {(time.time() - _start_time)} seconds ---")
 
-    imdb_ids_path = get_imdb_urls_dump_path()
-    for _dump_path in imdb_ids_path:
-        raw_urls = slice_list(read_imdb_dump(_dump_path))
-        process_one = multiprocessing.Process(
-            target=process,
-            args=(
-                raw_urls[0],
-                "update",
-            ),
-        )
-        process_two = multiprocessing.Process(
-            target=process,
-            args=(
-                raw_urls[1],
-                "update",
-            ),
-        )
-        process_one.start()
-        process_two.start()
-        process_one.join()
-        process_two.join()
-
-        os.remove(_dump_path)
-        del raw_urls
-        gc.collect()
+    _stopped = False
+    if scrape_new:
+        work_queue = WorkQueue("add")
+        work_queue.release_leases()
+        work_queue.close()
+        _stopped = orchestrate("add", workers, parse_workers, use_page_cache)["stopped"]
+    if not _stopped:
+        _update_start_time = time.time()
+        orchestrate("update", workers, parse_workers, use_page_cache)
+        # the ids a stopped run left pending stay queued for the next one
+        postpone_failed_refreshes(_update_start_time)
     logger.info(f"Program ended {(time.time() - _start_time)} seconds ---")
 
 
 if __name__ == "__main__":
-    number_of_years = 1
-    list_to_be_updated(number_of_years)
-    main()
+    arguments = get_arguments()
+    set_up_database()
+    work_queue = WorkQueue("update")
+    # nothing else works on the queue, whatever is leased was left by a run that stopped
+    work_queue.release_leases()
+    if work_queue.has_work():
+        logger.info("resuming the previous run")
+    elif arguments.from_snapshot:
+        queue_snapshot_diff(arguments.source)
+    elif arguments.from_ratings:
+        refresh_ratings(arguments.source)
+    elif arguments.years:
+        list_to_be_updated(arguments.years)
+    else:
+        list_due_for_update(arguments.budget)
+    work_queue.close()
+    main(
+        arguments.workers,
+        arguments.page_cache,
+        arguments.from_snapshot,
+        arguments.parse_workers,
+    )